@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select
+import json
+import pytz
+import database
+import feedback_cache
+import instrumentation
+import job_queue
+from database import Place
+
+config = database.get_config()
+
+# 이 시간(초) 안에 저장된 분석 결과가 있으면 다시 실행하지 않고 반환
+ANALYZE_FRESHNESS_SECONDS = config.get('ANALYZE_FRESHNESS_SECONDS', 3600)
+
+QUEUED = job_queue.QUEUED
+RUNNING = job_queue.RUNNING
+DONE = job_queue.DONE
+FAILED = job_queue.FAILED
+FRESH = 'fresh'
+
+# feedback.updated_at은 한국 시간으로 저장됨
+KST = pytz.timezone('Asia/Seoul')
+
+
+class PlaceNotFound(LookupError):
+    pass
+
+
+def _place_num(place_id):
+    session = database.Session()
+    try:
+        return session.execute(
+            select(Place.place_num).where(Place.place_id == place_id)).scalar_one_or_none()
+    finally:
+        database.Session.remove()
+
+
+def _load_feedback(place_id):
+    feedback = feedback_cache.get(place_id)
+    if feedback is None or feedback['updated_at'] is None:
+        return None
+    return feedback
+
+
+def _is_fresh(updated_at):
+    if updated_at.tzinfo is None:
+        updated_at = KST.localize(updated_at)
+    return datetime.now(KST) - updated_at < timedelta(seconds=ANALYZE_FRESHNESS_SECONDS)
+
+
+def _serialize(result):
+    if result is None:
+        return None
+    return dict(result, updated_at=result['updated_at'].isoformat())
+
+
+def _utc(value):
+    # crawl_job 시각은 UTC 기준 naive datetime으로 저장됨
+    return value.replace(tzinfo=timezone.utc).isoformat() if value else None
+
+
+def _job_info(job):
+    return {
+        'job_id': job.job_id,
+        'place_id': job.place_id,
+        'status': job.status,
+        'attempts': job.attempts,
+        'submitted_at': _utc(job.created_at),
+        'run_after': _utc(job.run_after) if job.status == QUEUED else None,
+        'started_at': _utc(job.started_at),
+        'finished_at': _utc(job.finished_at),
+        'stages': json.loads(job.stages) if job.stages else {},
+        'error': job.last_error,
+        'result': _serialize(_load_feedback(job.place_id)) if job.status == DONE else None,
+    }
+
+
+def submit(place_id, force=False):
+    """place 하나의 수집/분석 작업을 작업 큐에 등록하고 작업 정보를 반환합니다.
+
+    같은 place의 작업이 이미 대기 중이거나 실행 중이면 그 작업을 반환하고,
+    ANALYZE_FRESHNESS_SECONDS 안에 저장된 결과가 있으면 등록하지 않고 결과를 반환합니다.
+    """
+    place_num = _place_num(place_id)
+    if place_num is None:
+        raise PlaceNotFound(f"place_id {place_id}를 찾을 수 없습니다.")
+
+    if not force:
+        result = _load_feedback(place_id)
+        if result and _is_fresh(result['updated_at']):
+            instrumentation.inc('analyze_jobs_total', outcome='fresh')
+            return {'job_id': None, 'place_id': place_id, 'status': FRESH,
+                    'result': _serialize(result), 'merged': False}
+
+    # 실행은 작업자(worker.py)가 맡음 - 대기/실행 중인 작업이 있으면 등록되지 않고 그 작업으로 합침
+    added = job_queue.enqueue([(place_id, place_num)])
+    job = job_queue.latest_job(place_id)
+    instrumentation.inc('analyze_jobs_total', outcome='created' if added else 'merged')
+    return dict(_job_info(job), merged=not added)
+
+
+def get_job(job_id):
+    job = job_queue.get_job(job_id)
+    if job is None:
+        return None
+    return _job_info(job)
@@ -0,0 +1,348 @@
+"""오프라인 벤치마크: 저장된 리뷰 페이지와 Clova 스텁 서버로 전체 파이프라인을 측정합니다.
+
+저장소 루트에서 실행합니다. 외부 네트워크, 운영 DB, 실제 Clova API를 사용하지 않습니다.
+
+    python benchmark/run_benchmark.py
+    python benchmark/run_benchmark.py --modes process --places 100 --clova-latency 1.0
+    python benchmark/run_benchmark.py --output result.json
+    python benchmark/run_benchmark.py --baseline result.json   # 처리량이 떨어지면 종료 코드 1
+
+측정 방식 (mode):
+    crawler  - 한 프로세스에서 스레드 풀로 naver_review.run_crawler 실행 (수집 + 분석 + 저장)
+    analyze  - 수집된 리뷰가 저장된 상태에서 review_analyze.run_analyze만 실행
+    process  - main.do_process_crawl (프로세스 x 스레드) 실행
+
+시나리오마다 새 작업 디렉터리(SQLite DB, privateKey.json, 측정 파일)를 만들고 별도 프로세스에서
+실행하므로 시나리오 간에 캐시나 메모리 사용량이 섞이지 않습니다.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+
+MODES = ['crawler', 'analyze', 'process']
+PLACE_COUNTS = [10, 100, 1000]
+# 벤치마크용 place 번호 시작값
+PLACE_NUM_BASE = 1000000
+
+QUANTILES = (0.5, 0.99)
+
+
+def _place_pairs(count):
+    return [(place_id, str(PLACE_NUM_BASE + place_id)) for place_id in range(1, count + 1)]
+
+
+def _write_config(workdir, args, clova_url):
+    config = {
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'service.db')}",
+        'CLOVA_HOST': clova_url,
+        'X_NCP_CLOVASTUDIO_API_KEY': 'benchmark',
+        'X_NCP_APIGW_API_KEY': 'benchmark',
+        'X_NCP_CLOVASTUDIO_REQUEST_ID_1': 'benchmark-review',
+        'X_NCP_CLOVASTUDIO_REQUEST_ID_2': 'benchmark-feedback',
+        'CLOVA_MAX_CONCURRENCY': args.clova_concurrency,
+        'CLOVA_RATE_PER_SEC': args.clova_rate,
+        'CLOVA_BURST': args.clova_burst,
+        'FEEDBACK_WRITE_BEHIND': args.write_behind,
+    }
+    with open(os.path.join(workdir, 'privateKey.json'), 'w') as f:
+        json.dump(config, f, indent=2)
+
+
+# ---- 시나리오 실행 (자식 프로세스) ----
+
+def _use_workdir(workdir):
+    # 파일 기반 저장소를 작업 디렉터리로 옮겨 저장소의 files/를 건드리지 않음
+    import completion_cache
+    import feedback_cache
+    import review_state
+    import review_store
+
+    files_dir = os.path.join(workdir, 'files')
+    feedback_cache.STAMP_PATH = os.path.join(files_dir, 'feedback.stamp')
+    review_state.STATE_DB_PATH = os.path.join(files_dir, 'review_state.db')
+    review_store.STORE_DB_PATH = os.path.join(files_dir, 'review_store.db')
+    completion_cache.cache.path = os.path.join(files_dir, 'completion_cache.db')
+
+
+def _seed_database(place_pairs):
+    from sqlalchemy import text
+    import database
+
+    engine = database.get_engine()
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS place ("
+                          "place_id INTEGER PRIMARY KEY, place_num VARCHAR)"))
+        conn.execute(text("INSERT INTO place (place_id, place_num) VALUES (:place_id, :place_num)"),
+                     [{'place_id': p, 'place_num': n} for p, n in place_pairs])
+    database.Feedback.__table__.create(engine, checkfirst=True)
+    with engine.begin() as conn:
+        conn.execute(database.Feedback.__table__.insert(),
+                     [{'place_id': p} for p, _ in place_pairs])
+
+
+def _analyzed_count():
+    from sqlalchemy import text
+    import database
+
+    with database.get_engine().connect() as conn:
+        return conn.execute(text("SELECT COUNT(*) FROM feedback WHERE updated_at IS NOT NULL")).scalar()
+
+
+def _run_pool(fn, items, threads):
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(fn, items))
+
+
+def run_scenario(args):
+    """작업 디렉터리(cwd)에서 시나리오 하나를 실행하고 결과를 result.json에 기록합니다."""
+    workdir = os.getcwd()
+    sys.path.insert(0, REPO_DIR)
+    _use_workdir(workdir)
+
+    import instrumentation
+
+    place_pairs = _place_pairs(args.scenario_places)
+    mode = args.scenario
+
+    if mode == 'crawler':
+        import naver_review
+        import review_analyze
+        _seed_database(place_pairs)
+
+        started_at = time.perf_counter()
+        results = _run_pool(lambda pair: naver_review.run_crawler(*pair, args.backend),
+                            place_pairs, args.threads)
+        if review_analyze.FEEDBACK_WRITE_BEHIND:
+            review_analyze.get_feedback_writer().flush()
+        elapsed = time.perf_counter() - started_at
+        failed = results.count(False)
+
+    elif mode == 'analyze':
+        import review_analyze
+        import review_state
+        sys.path.insert(0, BENCHMARK_DIR)
+        from stub_servers import NaverStub
+
+        _seed_database(place_pairs)
+        naver = NaverStub(pages=args.pages)
+        for place_id, place_num in place_pairs:
+            review_state.save(place_id, naver.reviews(place_num))
+        naver.close()
+
+        def analyze(pair):
+            try:
+                return review_analyze.run_analyze(pair[0])
+            except review_analyze.AnalysisIncomplete:
+                return None
+
+        started_at = time.perf_counter()
+        results = _run_pool(analyze, place_pairs, args.threads)
+        if review_analyze.FEEDBACK_WRITE_BEHIND:
+            review_analyze.get_feedback_writer().flush()
+        elapsed = time.perf_counter() - started_at
+        failed = results.count(None)
+
+    else:
+        import main
+        _seed_database(place_pairs)
+
+        started_at = time.perf_counter()
+        main.do_process_crawl(place_pairs, args.max_in_flight)
+        elapsed = time.perf_counter() - started_at
+        failed = None
+
+    instrumentation.flush()
+    counters, _, histograms = instrumentation.collect()
+
+    stages = {}
+    for (name, labels), hist in histograms.items():
+        if name != 'pipeline_stage_seconds':
+            continue
+        labels = dict(labels)
+        stage = labels.pop('stage')
+        if labels:
+            stage += '[' + ','.join(f"{v}" for _, v in sorted(labels.items())) + ']'
+        stages[stage] = {
+            'count': hist['count'],
+            'mean': hist['sum'] / hist['count'] if hist['count'] else None,
+            **{f"p{int(q * 100)}": instrumentation.histogram_quantile(q, hist) for q in QUANTILES},
+        }
+
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    child_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    result = {
+        'mode': mode,
+        'places': len(place_pairs),
+        'seconds': elapsed,
+        'places_per_sec': len(place_pairs) / elapsed if elapsed else None,
+        'analyzed': _analyzed_count(),
+        'failed': failed,
+        # Linux의 ru_maxrss 단위는 KB, 자식 프로세스 값은 가장 큰 프로세스 하나의 값
+        'peak_rss_mb': self_usage.ru_maxrss / 1024,
+        'peak_child_rss_mb': child_usage.ru_maxrss / 1024,
+        'stages': stages,
+        'counters': {name + (json.dumps(dict(labels), ensure_ascii=False) if labels else ''): value
+                     for (name, labels), value in sorted(counters.items())},
+    }
+    with open(os.path.join(workdir, 'result.json'), 'w') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+# ---- 벤치마크 실행 (부모 프로세스) ----
+
+def _scenario_args(args, mode, places):
+    return [
+        '--scenario', mode, '--scenario-places', str(places),
+        '--threads', str(args.threads), '--max-in-flight', str(args.max_in_flight),
+        '--backend', args.backend, '--pages', str(args.pages),
+    ]
+
+
+def run_benchmark(args):
+    sys.path.insert(0, BENCHMARK_DIR)
+    from stub_servers import ClovaStub, NaverStub
+
+    naver = NaverStub(pages=args.pages, latency=args.naver_latency)
+    clova = ClovaStub(latency=args.clova_latency, token_delay=args.clova_token_delay,
+                      tokens=args.clova_tokens, jitter=args.clova_jitter,
+                      error_rate=args.clova_error_rate)
+
+    results = []
+    try:
+        for mode in args.modes:
+            for places in args.places:
+                workdir = tempfile.mkdtemp(prefix=f'bench-{mode}-{places}-')
+                _write_config(workdir, args, clova.url)
+                env = dict(os.environ,
+                           NAVER_PLACE_HOST=naver.url,
+                           NAVER_GRAPHQL_URL=naver.url + '/graphql',
+                           CRAWL_MAX_PAGES=str(args.pages),
+                           METRICS_DIR=os.path.join(workdir, 'metrics'),
+                           LOG_LEVEL=args.log_level)
+
+                print(f"== {mode} x {places} places ...", flush=True)
+                clova_requests = clova.requests
+                proc = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__)] + _scenario_args(args, mode, places),
+                    cwd=workdir, env=env, timeout=args.timeout)
+                if proc.returncode != 0:
+                    print(f"   실패 (종료 코드 {proc.returncode}), 작업 디렉터리: {workdir}")
+                    results.append({'mode': mode, 'places': places, 'error': proc.returncode})
+                    continue
+
+                with open(os.path.join(workdir, 'result.json')) as f:
+                    result = json.load(f)
+                result['clova_requests'] = clova.requests - clova_requests
+                results.append(result)
+                _print_result(result)
+
+                if args.keep:
+                    print(f"   작업 디렉터리: {workdir}")
+                else:
+                    shutil.rmtree(workdir, ignore_errors=True)
+    finally:
+        naver.close()
+        clova.close()
+
+    return results
+
+
+def _fmt(seconds):
+    if seconds is None:
+        return '-'
+    return f"{seconds * 1000:.0f}ms" if seconds < 1 else f"{seconds:.2f}s"
+
+
+def _print_result(result):
+    print(f"   {result['places']} places in {result['seconds']:.2f}s "
+          f"-> {result['places_per_sec']:.2f} places/s, analyzed {result['analyzed']}, "
+          f"peak RSS {result['peak_rss_mb']:.0f}MB (child {result['peak_child_rss_mb']:.0f}MB)")
+    for stage, s in sorted(result['stages'].items()):
+        print(f"     {stage:<28} n={s['count']:<6} p50={_fmt(s['p50']):>8} p99={_fmt(s['p99']):>8}")
+
+
+def compare(results, baseline_path, tolerance):
+    """기준 결과보다 처리량이 tolerance 비율 이상 떨어진 시나리오를 반환합니다."""
+    with open(baseline_path) as f:
+        baseline = {(r['mode'], r['places']): r for r in json.load(f) if 'error' not in r}
+
+    regressions = []
+    for result in results:
+        base = baseline.get((result['mode'], result['places']))
+        if base is None:
+            continue
+        if 'error' in result:
+            regressions.append((result['mode'], result['places'], base['places_per_sec'], None))
+        elif result['places_per_sec'] < base['places_per_sec'] * (1 - tolerance):
+            regressions.append((result['mode'], result['places'],
+                                base['places_per_sec'], result['places_per_sec']))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    parser.add_argument('--places', nargs='+', type=int, default=PLACE_COUNTS)
+    parser.add_argument('--threads', type=int, default=8,
+                        help='crawler/analyze 모드의 스레드 수')
+    parser.add_argument('--max-in-flight', type=int, default=32,
+                        help='process 모드의 최대 동시 처리 place 수')
+    parser.add_argument('--backend', choices=['http', 'selenium'], default='http')
+    parser.add_argument('--pages', type=int, default=3, help='place당 리뷰 페이지 수')
+    parser.add_argument('--naver-latency', type=float, default=0.05)
+    parser.add_argument('--clova-latency', type=float, default=0.5,
+                        help='Clova 스텁의 첫 이벤트까지 걸리는 시간(초)')
+    parser.add_argument('--clova-token-delay', type=float, default=0.0)
+    parser.add_argument('--clova-tokens', type=int, default=20)
+    parser.add_argument('--clova-jitter', type=float, default=0.2)
+    parser.add_argument('--clova-error-rate', type=float, default=0.0)
+    parser.add_argument('--clova-concurrency', type=int, default=8)
+    parser.add_argument('--clova-rate', type=float, default=100.0)
+    parser.add_argument('--clova-burst', type=int, default=16)
+    parser.add_argument('--write-behind', action='store_true')
+    parser.add_argument('--timeout', type=float, default=3600)
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--keep', action='store_true', help='작업 디렉터리를 남겨둠')
+    parser.add_argument('--output', help='결과를 JSON 파일로 저장')
+    parser.add_argument('--baseline', help='비교할 이전 결과 JSON 파일')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--scenario', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--scenario-places', type=int, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.scenario:
+        run_scenario(args)
+        return 0
+
+    results = run_benchmark(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for mode, places, before, after in regressions:
+            after = f"{after:.2f}" if after is not None else '실패'
+            print(f"처리량 저하: {mode} x {places}: {before:.2f} -> {after} places/s")
+        if regressions:
+            return 1
+
+    return 1 if any('error' in r for r in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
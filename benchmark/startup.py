@@ -0,0 +1,121 @@
+"""시작 비용 측정: 모듈별 import 시간/메모리와 ProcessPoolExecutor 자식 프로세스 준비 시간.
+
+저장소 루트에서 실행합니다.
+
+    python benchmark/startup.py
+    python benchmark/startup.py --repeat 10 --output startup.json
+
+모듈마다 새 인터프리터에서 import 하므로 디스크 캐시 외에는 이전 측정의 영향을 받지 않습니다.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+
+MODULES = ['main', 'worker', 'crawl_batch', 'naver_review', 'review_analyze']
+# 웹 프로세스/작업자 시작 시 불러오지 않아야 하는 무거운 의존성
+HEAVY_MODULES = ['selenium', 'webdriver_manager', 'bs4', 'lxml', 'pandas', 'instagrapi',
+                 'fastapi', 'httpx', 'apscheduler']
+
+IMPORT_SCRIPT = """
+import json, resource, sys, time
+sys.path.insert(0, {repo!r})
+started_at = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started_at
+print(json.dumps({{
+    'seconds': elapsed,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'modules': len(sys.modules),
+    'heavy': sorted(m for m in {heavy!r} if m in sys.modules),
+}}))
+"""
+
+# 웹 프로세스(main)에서 배치를 자식 프로세스로 넘길 때 첫 결과를 받기까지의 시간
+SPAWN_SCRIPT = """
+import json, multiprocessing, sys, time
+from concurrent.futures import ProcessPoolExecutor
+sys.path.insert(0, {repo!r})
+import main
+context = multiprocessing.get_context({method!r})
+started_at = time.perf_counter()
+with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+    executor.submit(main.do_thread_crawl_and_analyze, [], 1).result()
+    first = time.perf_counter() - started_at
+print(json.dumps({{'seconds': first}}))
+"""
+
+
+def _write_config(workdir):
+    config = {
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'service.db')}",
+        'CLOVA_HOST': 'http://127.0.0.1:9',
+        'X_NCP_CLOVASTUDIO_API_KEY': 'benchmark',
+        'X_NCP_APIGW_API_KEY': 'benchmark',
+        'X_NCP_CLOVASTUDIO_REQUEST_ID_1': 'benchmark-review',
+        'X_NCP_CLOVASTUDIO_REQUEST_ID_2': 'benchmark-feedback',
+    }
+    with open(os.path.join(workdir, 'privateKey.json'), 'w') as f:
+        json.dump(config, f)
+
+
+def _run(script, workdir):
+    env = dict(os.environ, METRICS_DIR=os.path.join(workdir, 'metrics'), LOG_LEVEL='WARNING')
+    proc = subprocess.run([sys.executable, '-c', script], cwd=workdir, env=env,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else proc.returncode)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def measure(repeat):
+    workdir = tempfile.mkdtemp(prefix='bench-startup-')
+    _write_config(workdir)
+    results = {'imports': {}, 'spawn': {}}
+    try:
+        for module in MODULES:
+            runs = [_run(IMPORT_SCRIPT.format(repo=REPO_DIR, module=module, heavy=HEAVY_MODULES),
+                         workdir) for _ in range(repeat)]
+            results['imports'][module] = {
+                'seconds': statistics.median(r['seconds'] for r in runs),
+                'rss_mb': statistics.median(r['rss_mb'] for r in runs),
+                'modules': runs[-1]['modules'],
+                'heavy': runs[-1]['heavy'],
+            }
+        for method in ('fork', 'spawn'):
+            runs = [_run(SPAWN_SCRIPT.format(repo=REPO_DIR, method=method), workdir)
+                    for _ in range(repeat)]
+            results['spawn'][method] = {'seconds': statistics.median(r['seconds'] for r in runs)}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='결과를 JSON 파일로 저장')
+    args = parser.parse_args(argv)
+
+    results = measure(args.repeat)
+    for module, r in results['imports'].items():
+        print(f"import {module:<16} {r['seconds'] * 1000:7.0f}ms  RSS {r['rss_mb']:5.0f}MB  "
+              f"modules {r['modules']:5d}  heavy: {', '.join(r['heavy']) or '-'}")
+    for method, r in results['spawn'].items():
+        print(f"child ready ({method:<5})    {r['seconds'] * 1000:7.0f}ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,200 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+REVIEW_PATH_PATTERN = re.compile(r'^/place/(\d+)/review/visitor')
+
+
+def _load_fixture(name):
+    with open(os.path.join(FIXTURE_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def _start(handler):
+    server = _Server(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, name=handler.__name__,
+                     daemon=True).start()
+    return server
+
+
+class NaverStub:
+    """저장된 방문자 리뷰 페이지(HTML)와 다음 페이지 응답(GraphQL JSON)을 돌려주는 서버.
+
+    place 번호가 리뷰 본문에 들어가므로 place마다 리뷰 내용이 달라집니다.
+    pages 번째 페이지는 일부만 채워서 크롤러가 마지막 페이지로 인식하게 합니다.
+    """
+
+    def __init__(self, pages=3, latency=0.0):
+        self.pages = pages
+        self.latency = latency
+        self.html = _load_fixture('visitor_review.html')
+        self.page_json = _load_fixture('visitor_review_page.json')
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                match = REVIEW_PATH_PATTERN.match(urlparse(self.path).path)
+                if not match:
+                    self._send(404, b'', 'text/plain')
+                    return
+                stub._sleep()
+                self._send(200, stub.render_html(match.group(1)).encode('utf-8'),
+                           'text/html; charset=utf-8')
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                variables = payload[0]['variables']['input']
+                stub._sleep()
+                self._send(200, stub.render_page(variables['businessId'],
+                                                 variables['page']).encode('utf-8'),
+                           'application/json')
+
+            def _send(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = _start(Handler)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def _sleep(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def render_html(self, place_num):
+        return self.html.replace('__PLACE__', str(place_num))
+
+    def render_page(self, place_num, page):
+        data = json.loads(self.page_json.replace('__PLACE__', str(place_num))
+                          .replace('__PAGE__', str(page)))
+        items = data[0]['data']['visitorReviews']['items']
+        if page > self.pages:
+            items[:] = []
+        elif page == self.pages:
+            del items[3:]
+        return json.dumps(data, ensure_ascii=False)
+
+    def reviews(self, place_num):
+        """크롤러가 이 place에서 수집하게 될 리뷰 원문 목록 (분석 단독 측정용)."""
+        html = self.render_html(place_num)
+        state = json.loads(re.search(r'window\.__APOLLO_STATE__ = (\{.*?\});', html).group(1))
+        reviews = [v['body'] for v in state.values() if v.get('__typename') == 'VisitorReview']
+        for page in range(2, self.pages + 1):
+            items = json.loads(self.render_page(place_num, page))[0]['data']['visitorReviews']['items']
+            reviews.extend(item['body'] for item in items)
+        return reviews
+
+    def close(self):
+        self.server.shutdown()
+
+
+class ClovaStub:
+    """chat-completions(HCX-003) SSE 응답을 흉내 내는 서버.
+
+    latency(첫 이벤트까지의 시간) + tokens x token_delay 만큼 걸려 응답하며,
+    jitter 비율만큼 지연 시간을 무작위로 흔듭니다.
+    """
+
+    def __init__(self, latency=0.5, token_delay=0.0, tokens=20, jitter=0.2, error_rate=0.0):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.tokens = tokens
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests = 0
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                request_data = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with stub._lock:
+                    stub.requests += 1
+
+                time.sleep(stub._delay(stub.latency))
+                if stub.error_rate and random.random() < stub.error_rate:
+                    body = json.dumps({'status': {'code': '42901', 'message': 'Too many requests'}}).encode()
+                    self.send_response(429)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                for i in range(stub.tokens):
+                    self._chunk(f'id: {i}\nevent: token\ndata: '
+                                f'{{"message":{{"role":"assistant","content":"."}}}}\n\n')
+                    if stub.token_delay:
+                        time.sleep(stub._delay(stub.token_delay))
+                self._chunk(stub.result_event(request_data))
+                self.wfile.write(b'0\r\n\r\n')
+
+            def _chunk(self, text):
+                data = text.encode('utf-8')
+                self.wfile.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+
+            def log_message(self, *args):
+                pass
+
+        self.server = _start(Handler)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def _delay(self, seconds):
+        if not self.jitter:
+            return seconds
+        return max(0.0, seconds * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def result_event(self, request_data):
+        system = request_data['messages'][0]['content']
+        if 'positive_feedback' in system:
+            content = {'positive_feedback': '긍정 리뷰에서 언급된 메뉴를 홍보하세요.',
+                       'negative_feedback': '대기 시간 안내를 개선하세요.'}
+        else:
+            # 입력마다 요약이 달라야 피드백 요청이 캐시에 걸리지 않음
+            digest = hashlib.sha1(request_data['messages'][-1]['content'].encode('utf-8')).hexdigest()[:8]
+            content = {'positive': f'맛과 친절함이 좋다는 평이 많습니다. ({digest})',
+                       'negative': '대기 시간과 가격에 대한 불만이 있습니다.',
+                       'keyword': ['맛', '친절', '가격', '대기', '분위기']}
+        input_length = sum(len(m['content']) for m in request_data['messages']) * 2 // 3
+        result = {'message': {'role': 'assistant',
+                              'content': json.dumps(content, ensure_ascii=False)},
+                  'inputLength': input_length, 'outputLength': self.tokens,
+                  'stopReason': 'stop_before'}
+        return f'event: result\ndata: {json.dumps(result, ensure_ascii=False)}\n\n'
+
+    def close(self):
+        self.server.shutdown()
@@ -0,0 +1,511 @@
+import asyncio
+import codecs
+import json
+import os
+import random
+import re
+import threading
+import time
+import httpx
+import completion_cache
+import concurrency
+import instrumentation
+
+COMPLETION_PATH = '/testapp/v1/chat-completions/HCX-003'
+
+# API 할당량에 맞춘 기본값 (privateKey.json에서 변경 가능)
+DEFAULT_MAX_CONCURRENCY = 8
+# 응답이 느려지거나 429를 받으면 동시 요청 수를 이 값까지 줄임
+DEFAULT_MIN_CONCURRENCY = 1
+DEFAULT_RATE_PER_SEC = 2.0
+DEFAULT_BURST = 4
+DEFAULT_CONNECT_TIMEOUT = 5.0
+# 스트림에서 다음 조각을 기다리는 최대 시간(초)
+DEFAULT_READ_TIMEOUT = 60.0
+DEFAULT_TIMEOUT = httpx.Timeout(connect=DEFAULT_CONNECT_TIMEOUT, read=DEFAULT_READ_TIMEOUT,
+                                write=10.0, pool=30.0)
+# complete() 한 번의 최대 시간(초) - 자리/토큰 대기, 재시도와 백오프를 모두 포함하며 조금씩 오는 스트림도 여기서 끊음
+DEFAULT_DEADLINE = 90.0
+# 재시도 가능한 오류(429, 5xx, 연결/시간 초과)의 최대 재시도 횟수와 대기 시간(초)
+DEFAULT_MAX_RETRIES = 2
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 20.0
+# 재시도 가능한 오류가 연속으로 이만큼 나면 일정 시간(초) 동안 요청을 보내지 않음
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_COOLDOWN = 30.0
+
+# \r\n, \n, \r 모두 줄바꿈 (버퍼 끝의 \r은 다음 조각의 \n일 수 있어 보류)
+_LINE_END = re.compile(r'\r\n|\n|\r(?=.)', re.S)
+
+# 응답에 토큰 수가 없을 때 사용하는 추정치 (한국어 기준 토큰당 글자 수)
+CHARS_PER_TOKEN = 1.5
+
+logger = instrumentation.get_logger('clova')
+
+
+class ClovaError(Exception):
+    def __init__(self, message, status_code=None, retryable=None):
+        super().__init__(message)
+        self.status_code = status_code
+        if retryable is None:
+            # 상태 코드가 없으면 스트림 중단 등 일시적인 오류로 봄
+            retryable = status_code is None or status_code == 429 or status_code >= 500
+        self.retryable = retryable
+
+
+class ClovaUnavailable(ClovaError):
+    """회로 차단기가 열려 있어 요청을 보내지 않았습니다."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Clova API 장애로 요청을 중단했습니다. ({retry_after:.0f}초 후 재시도)",
+                         retryable=False)
+        self.retry_after = retry_after
+
+
+def _deadline_error(deadline):
+    # 남은 시간이 없으므로 더 재시도하지 않음
+    return ClovaError(f"{deadline:.0f}초 안에 응답을 받지 못했습니다.", retryable=False)
+
+
+def _as_clova_error(error, deadline):
+    if isinstance(error, ClovaError):
+        return error
+    if isinstance(error, asyncio.TimeoutError):
+        return _deadline_error(deadline)
+    return ClovaError(f"{type(error).__name__}: {error}")
+
+
+def build_timeout(connect=DEFAULT_CONNECT_TIMEOUT, read=DEFAULT_READ_TIMEOUT):
+    return httpx.Timeout(connect=connect, read=read, write=10.0, pool=30.0)
+
+
+class SSEEvent:
+
+    def __init__(self, event='message', data='', id=None):
+        self.event = event
+        self.data = data
+        self.id = id
+
+    def __repr__(self):
+        return f"SSEEvent(event={self.event!r}, data={self.data[:40]!r})"
+
+
+class SSEParser:
+    """text/event-stream 응답을 조각 단위로 받아 이벤트로 변환하는 파서."""
+
+    def __init__(self):
+        self._buffer = ''
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._reset()
+
+    def _reset(self):
+        self._event = None
+        self._data = []
+        self._id = None
+
+    def feed(self, chunk):
+        if isinstance(chunk, bytes):
+            chunk = self._decoder.decode(chunk)
+
+        self._buffer += chunk
+        events = []
+        pos = 0
+        while True:
+            match = _LINE_END.search(self._buffer, pos)
+            if match is None:
+                break
+
+            event = self._process_line(self._buffer[pos:match.start()])
+            if event is not None:
+                events.append(event)
+            pos = match.end()
+
+        self._buffer = self._buffer[pos:]
+        return events
+
+    def _process_line(self, line):
+        if line == '':
+            # 빈 줄에서 이벤트 확정
+            if not self._data and self._event is None:
+                return None
+            event = SSEEvent(self._event or 'message',
+                             '\n'.join(self._data), self._id)
+            self._reset()
+            return event
+
+        if line.startswith(':'):
+            return None
+
+        field, _, value = line.partition(':')
+        if value.startswith(' '):
+            value = value[1:]
+
+        if field == 'event':
+            self._event = value
+        elif field == 'data':
+            self._data.append(value)
+        elif field == 'id':
+            self._id = value
+        return None
+
+    def flush(self):
+        # 스트림이 빈 줄 없이 끝난 경우 남은 이벤트 반환
+        events = []
+        if self._buffer:
+            event = self._process_line(self._buffer.rstrip('\r'))
+            self._buffer = ''
+            if event is not None:
+                events.append(event)
+        event = self._process_line('')
+        if event is not None:
+            events.append(event)
+        return events
+
+
+class TokenBucket:
+    """초당 rate 개의 요청을 허용하고 최대 capacity 만큼 몰아서 쓸 수 있는 속도 제한기."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity,
+                                   self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _input_tokens(request_data, response_text):
+    # 결과 이벤트의 inputLength를 우선 사용하고, 없으면 글자 수로 추정
+    try:
+        tokens = json.loads(response_text).get('inputLength')
+        if tokens:
+            return tokens
+    except (json.JSONDecodeError, AttributeError):
+        pass
+    chars = sum(len(m.get('content', '')) for m in request_data.get('messages', []))
+    return int(chars / CHARS_PER_TOKEN)
+
+
+def parse_completion(response_text):
+    response_json = json.loads(response_text)
+
+    # 2단계: 내부 content의 문자열을 다시 JSON으로 파싱
+    content_str = response_json['message']['content']
+    # 이스케이프된 문자 처리
+    response = content_str.replace('\\"', '"').replace('\\n', '')
+    return json.loads(response)
+
+
+class CircuitBreaker:
+    """재시도 가능한 오류가 threshold번 연속되면 cooldown 동안 요청을 막습니다.
+
+    cooldown이 지나면 시험 요청 하나만 보내고, 성공하면 다시 열고 실패하면 다시 막습니다.
+    이벤트 루프 스레드에서만 상태를 바꾸며, retry_after()는 다른 스레드에서 읽어도 됩니다.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, threshold=DEFAULT_BREAKER_THRESHOLD, cooldown=DEFAULT_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def retry_after(self):
+        """요청을 보낼 수 있을 때까지 남은 시간(초)을 반환합니다. (보낼 수 있으면 0)"""
+        if self.state == self.OPEN:
+            return max(0.0, self._opened_at + self.cooldown - time.monotonic())
+        if self.state == self.HALF_OPEN and self._probing:
+            return 1.0
+        return 0.0
+
+    def allow(self):
+        if self.state == self.OPEN and self.retry_after() == 0:
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+        return self.state == self.CLOSED
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info("Clova API 회복, 요청을 재개합니다.")
+        self.state = self.CLOSED
+        self._failures = 0
+        self._probing = False
+        instrumentation.set_gauge('clova_circuit_open', 0)
+
+    def abandon(self):
+        # 시험 요청이 취소되면 다음 요청이 다시 시험할 수 있도록 함
+        self._probing = False
+
+    def record_failure(self):
+        self._failures += 1
+        if self.state == self.HALF_OPEN or self._failures >= self.threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"Clova API 오류 {self._failures}회 연속, "
+                               f"{self.cooldown:.0f}초 동안 요청을 중단합니다.")
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._probing = False
+            instrumentation.set_gauge('clova_circuit_open', 1)
+
+
+class ClovaClient:
+    """keep-alive 연결 풀을 공유하는 비동기 Clova chat-completions 클라이언트.
+
+    전용 스레드의 이벤트 루프에서 동작하므로, 동기 코드에서는 run()으로,
+    다른 이벤트 루프에서는 await client.wrap(coro)로 사용할 수 있습니다.
+    """
+
+    def __init__(self, host, api_key, apigw_key,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 rate_per_sec=DEFAULT_RATE_PER_SEC, burst=DEFAULT_BURST,
+                 timeout=DEFAULT_TIMEOUT, cache=completion_cache.cache,
+                 min_concurrency=DEFAULT_MIN_CONCURRENCY, deadline=DEFAULT_DEADLINE,
+                 max_retries=DEFAULT_MAX_RETRIES, breaker_threshold=DEFAULT_BREAKER_THRESHOLD,
+                 breaker_cooldown=DEFAULT_BREAKER_COOLDOWN):
+        self.host = host
+        self.api_key = api_key
+        self.apigw_key = apigw_key
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min(min_concurrency, max_concurrency)
+        self.rate_per_sec = rate_per_sec
+        self.burst = burst
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.cache = cache
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+
+        self._loop = asyncio.new_event_loop()
+        self._started = threading.Event()
+        self._thread = threading.Thread(target=self._loop.run_forever,
+                                        name='clova-client', daemon=True)
+        self._thread.start()
+        self._loop.call_soon_threadsafe(self._setup)
+        self._started.wait()
+
+    def _setup(self):
+        self._http = httpx.AsyncClient(
+            base_url=self.host, timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.max_concurrency,
+                                max_keepalive_connections=self.max_concurrency))
+        # 동시 요청 수는 min~max 사이에서 응답 시간과 429 응답에 따라 조정
+        self._aimd = concurrency.AIMDLimit(self.min_concurrency, self.max_concurrency,
+                                           initial=self.max_concurrency)
+        self._limiter = concurrency.AsyncLimiter(self._aimd.limit)
+        self._finished = 0
+        self._bucket = TokenBucket(self.rate_per_sec, self.burst)
+        instrumentation.set_gauge('concurrency_limit', self._aimd.limit, kind='clova')
+        self._started.set()
+
+    def _adapt(self, seconds, throttled=False):
+        # 이벤트 루프 스레드에서만 호출됨
+        if seconds is not None:
+            self._aimd.record(seconds)
+        self._finished += 1
+        # 상한만큼 요청이 끝날 때마다 (429를 받으면 바로) 상한을 다시 계산
+        if not throttled and self._finished < self._limiter.limit:
+            return
+        self._finished = 0
+        before = self._limiter.limit
+        limit = self._aimd.update(self._limiter.take_saturated(), pressure=throttled)
+        self._limiter.set_limit(limit)
+        instrumentation.set_gauge('concurrency_limit', limit, kind='clova')
+        if limit != before:
+            logger.info(f"clova 동시 요청 수 {before} -> {limit}"
+                        + (" (429)" if throttled else ""),
+                        extra={'kind': 'clova', 'limit': limit, 'baseline': self._aimd.baseline})
+
+    def _headers(self, request_id):
+        headers = {
+            'X-NCP-CLOVASTUDIO-API-KEY': self.api_key,
+            'X-NCP-APIGW-API-KEY': self.apigw_key,
+            'Content-Type': 'application/json; charset=utf-8',
+            'Accept': 'text/event-stream'
+        }
+        if request_id:
+            headers['X-NCP-CLOVASTUDIO-REQUEST-ID'] = request_id
+        return headers
+
+    async def _stream_result(self, request_data, request_id):
+        parser = SSEParser()
+        async with self._http.stream('POST', COMPLETION_PATH, headers=self._headers(request_id),
+                                     json=request_data) as r:
+            if r.status_code != 200:
+                body = await r.aread()
+                raise ClovaError(
+                    f"HTTP {r.status_code}: {body[:200].decode('utf-8', 'replace')}",
+                    status_code=r.status_code)
+
+            async for chunk in r.aiter_bytes():
+                for event in parser.feed(chunk):
+                    if event.event == 'result':
+                        return event.data
+                    if event.event == 'error':
+                        raise ClovaError(f"error event: {event.data}")
+
+        for event in parser.flush():
+            if event.event == 'result':
+                return event.data
+        raise ClovaError("event:result를 받지 못했습니다.")
+
+    async def complete(self, request_data, request_id=None, label='completion', validate=None):
+        """요청 하나를 실행하고 content를 JSON으로 파싱해서 반환합니다.
+
+        validate(content)가 거짓이면 ClovaError를 올리고 응답을 캐시에 저장하지 않습니다.
+        """
+        cache_key = completion_cache.make_key(COMPLETION_PATH, request_data)
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            # 형식이 맞지 않는 (이전에 저장된) 응답은 캐시에 없는 것으로 봄
+            if cached is not None and (validate is None or validate(cached)):
+                instrumentation.inc('clova_cache_hits_total', call=label)
+                logger.info(f"{label} response: cache hit", extra={'call': label})
+                return cached
+            instrumentation.inc('clova_cache_misses_total', call=label)
+
+        # 재시도를 포함한 전체 호출의 마감 시각
+        deadline_at = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            try:
+                response_text = await self._attempt(request_data, request_id, label, deadline_at)
+                break
+            except ClovaError as e:
+                if not e.retryable or attempt >= self.max_retries:
+                    raise
+                # 지터를 준 지수 백오프 (동시에 실패한 요청이 한꺼번에 다시 몰리지 않도록)
+                delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+                if time.monotonic() + delay >= deadline_at:
+                    # 기다리고 나면 마감 시각이 지나므로 재시도하지 않음
+                    raise
+                attempt += 1
+                instrumentation.inc('clova_retries_total', call=label)
+                logger.warning(f"{label} 요청 실패, {delay:.1f}초 후 재시도 "
+                               f"({attempt}/{self.max_retries}): {e}", extra={'call': label})
+                await asyncio.sleep(delay)
+
+        instrumentation.inc('clova_requests_total', call=label, outcome='ok')
+        instrumentation.inc('clova_tokens_sent_total',
+                            _input_tokens(request_data, response_text), call=label)
+        logger.debug(f"{label} response", extra={'call': label, 'response': response_text})
+
+        try:
+            content_json = parse_completion(response_text)
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            instrumentation.inc('clova_parse_failures_total', call=label)
+            raise ClovaError(f"JSON 변환 오류: {e}") from e
+        if validate is not None and not validate(content_json):
+            instrumentation.inc('clova_parse_failures_total', call=label)
+            raise ClovaError(f"응답 형식 오류: {str(content_json)[:200]}")
+
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put, cache_key, content_json)
+        return content_json
+
+    async def _attempt(self, request_data, request_id, label, deadline_at):
+        # 재시도 대기 중에는 동시 요청 자리를 차지하지 않도록 시도마다 자리를 받음
+        if not self.breaker.allow():
+            instrumentation.inc('clova_requests_total', call=label, outcome='rejected')
+            raise ClovaUnavailable(self.breaker.retry_after())
+
+        await self._limiter.acquire()
+        try:
+            await self._bucket.acquire()
+            started_at = time.monotonic()
+            remaining = deadline_at - started_at
+            if remaining <= 0:
+                # 자리/토큰을 기다리다 마감 시각이 지남 (요청은 보내지 않음)
+                self.breaker.abandon()
+                instrumentation.inc('clova_requests_total', call=label, outcome='expired')
+                raise _deadline_error(self.deadline)
+            try:
+                with instrumentation.timer('clova', call=label):
+                    response_text = await asyncio.wait_for(
+                        self._stream_result(request_data, request_id), remaining)
+            except (ClovaError, httpx.TransportError, asyncio.TimeoutError) as e:
+                error = _as_clova_error(e, self.deadline)
+                instrumentation.inc('clova_requests_total', call=label, outcome='error')
+                self._adapt(None, throttled=error.status_code == 429)
+                timed_out = isinstance(e, asyncio.TimeoutError)
+                if timed_out and remaining < self.deadline / 2:
+                    # 앞선 대기/재시도로 남은 시간이 짧았던 경우는 API 장애로 보지 않음
+                    self.breaker.abandon()
+                # 4xx 응답(429 포함)은 API가 동작 중이라는 뜻이므로 차단기에는 성공으로 기록
+                # (429는 동시 요청 수 조절로 대응)
+                elif timed_out or (error.retryable and error.status_code != 429):
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                if error is e:
+                    raise
+                raise error from e
+            except BaseException:
+                self.breaker.abandon()
+                raise
+            self._adapt(time.monotonic() - started_at)
+            self.breaker.record_success()
+            return response_text
+        finally:
+            self._limiter.release()
+
+    async def complete_many(self, requests, request_id=None, label='completion'):
+        """여러 요청을 동시에 실행합니다. 실패한 요청은 예외 객체로 반환됩니다."""
+        return await asyncio.gather(
+            *[self.complete(data, request_id, label) for data in requests],
+            return_exceptions=True)
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def run(self, coro):
+        # 동기 코드(크롤러 스레드 등)에서 호출
+        return self.submit(coro).result()
+
+    async def wrap(self, coro):
+        # 다른 이벤트 루프에서 호출
+        return await asyncio.wrap_future(self.submit(coro))
+
+    def close(self):
+        if self._loop.is_closed():
+            return
+        self.run(self._http.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop.close()
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_client(**kwargs):
+    """현재 프로세스의 ClovaClient를 반환합니다. (fork 된 자식은 새 클라이언트를 생성)"""
+    global _client, _client_pid
+
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = ClovaClient(**kwargs)
+            _client_pid = os.getpid()
+        return _client
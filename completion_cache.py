@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_DB_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'files', 'completion_cache.db')
+
+# 저장할 최대 응답 수 (초과 시 가장 오래 사용하지 않은 항목부터 삭제)
+MAX_ENTRIES = 20000
+
+
+def make_key(path, request_data):
+    # 모델 경로 + messages + 샘플링 파라미터 전체를 정규화해서 해시
+    payload = json.dumps({'path': path, 'request': request_data},
+                         sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class CompletionCache:
+    """Clova 응답(JSON 파싱 결과)을 요청 내용 기준으로 디스크에 저장하는 캐시."""
+
+    def __init__(self, path=CACHE_DB_PATH, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS completion (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )""")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS completion_last_used ON completion (last_used)")
+            self._initialized = True
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT response FROM completion WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                with conn:
+                    conn.execute("UPDATE completion SET last_used = ? WHERE key = ?",
+                                 (time.time(), key))
+        finally:
+            conn.close()
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, response):
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("""
+                    INSERT OR REPLACE INTO completion (key, response, created_at, last_used)
+                    VALUES (?, ?, ?, ?)""",
+                             (key, json.dumps(response, ensure_ascii=False), now, now))
+
+                # 용량 초과분은 오래 사용하지 않은 순으로 삭제
+                count = conn.execute(
+                    "SELECT COUNT(*) FROM completion").fetchone()[0]
+                if count > self.max_entries:
+                    conn.execute("""
+                        DELETE FROM completion WHERE key IN (
+                            SELECT key FROM completion ORDER BY last_used LIMIT ?)""",
+                                 (count - self.max_entries,))
+        finally:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+cache = CompletionCache()
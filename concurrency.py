@@ -0,0 +1,256 @@
+from contextlib import contextmanager
+import asyncio
+import collections
+import os
+import statistics
+import threading
+import time
+import instrumentation
+
+logger = instrumentation.get_logger('concurrency')
+
+# 동시 실행 수를 다시 계산하는 주기(초)
+CONTROL_INTERVAL = 5.0
+# 남은 메모리가 이보다 적으면 동시 실행 수를 줄임 (headless Chrome 하나가 대략 200~300MB 사용)
+MIN_FREE_MEMORY_MB = 1024
+# 코어당 1분 평균 부하가 이보다 높으면 동시 실행 수를 줄임
+MAX_CPU_LOAD = 0.9
+# 처리 시간 중앙값이 기준치(지금까지의 최솟값)의 이 배수를 넘으면 혼잡으로 판단
+LATENCY_TOLERANCE = 2.0
+# 혼잡하거나 자원이 부족할 때 상한에 곱하는 값
+DECREASE_FACTOR = 0.75
+# 자원 부족으로 줄인 뒤 이 시간(초) 동안은 다시 줄이지 않음 (1분 평균 부하가 감소를 반영할 때까지 기다림)
+PRESSURE_COOLDOWN = 30.0
+# 기준 처리 시간을 매 주기 이 비율만큼 올려서 오래된 최솟값을 서서히 잊음
+BASELINE_DRIFT = 1.05
+
+
+def available_memory_mb():
+    """사용 가능한 메모리(MB)를 반환합니다. 알 수 없으면 None."""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def cpu_load():
+    """코어당 1분 평균 부하를 반환합니다. 알 수 없으면 None."""
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (OSError, AttributeError):
+        return None
+
+
+class AIMDLimit:
+    """floor~ceiling 사이에서 동시 실행 수 상한을 조정합니다.
+
+    혼잡(처리 시간 급증)하거나 자원이 부족하면 곱으로 줄이고,
+    상한까지 모두 사용 중이면서 여유가 있으면 1씩 늘립니다.
+    """
+
+    def __init__(self, floor, ceiling, initial=None):
+        self.floor = max(1, floor)
+        self.ceiling = max(self.floor, ceiling)
+        self.limit = min(self.ceiling, max(self.floor, initial or self.floor))
+        self.baseline = None
+        self._samples = []
+
+    def record(self, seconds):
+        self._samples.append(seconds)
+
+    def update(self, saturated, pressure=False):
+        """한 주기 동안의 관측값으로 상한을 조정하고 새 상한을 반환합니다."""
+        samples, self._samples = self._samples, []
+        latency = statistics.median(samples) if samples else None
+        if latency is not None:
+            self.baseline = latency if self.baseline is None else min(
+                latency, self.baseline * BASELINE_DRIFT)
+
+        congested = latency is not None and latency > self.baseline * LATENCY_TOLERANCE
+        if pressure or congested:
+            self.limit = max(self.floor, int(self.limit * DECREASE_FACTOR))
+        elif saturated:
+            self.limit = min(self.ceiling, self.limit + 1)
+        return self.limit
+
+
+class Limiter:
+    """상한을 실행 중에 바꿀 수 있는 세마포어 (스레드용)."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_use = 0
+        self._saturated = False
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_use >= self.limit:
+                self._saturated = True
+                self._cond.wait()
+            self.in_use += 1
+
+    def release(self):
+        with self._cond:
+            self.in_use -= 1
+            self._cond.notify()
+
+    def available(self):
+        with self._cond:
+            free = self.limit - self.in_use
+            if free <= 0:
+                self._saturated = True
+            return max(0, free)
+
+    def set_limit(self, limit):
+        with self._cond:
+            self.limit = limit
+            self._cond.notify_all()
+
+    def take_saturated(self):
+        # 지난 주기에 상한까지 모두 사용한 적이 있는지 (확인 후 초기화)
+        with self._cond:
+            saturated = self._saturated or self.in_use >= self.limit
+            self._saturated = False
+            return saturated
+
+
+class AsyncLimiter:
+    """상한을 실행 중에 바꿀 수 있는 세마포어 (이벤트 루프 안에서만 사용)."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_use = 0
+        self._saturated = False
+        self._waiters = collections.deque()
+
+    async def acquire(self):
+        while self.in_use >= self.limit:
+            self._saturated = True
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # 깨워진 직후 취소되었으면 다음 대기자에게 넘김
+                self._wake()
+                raise
+        self.in_use += 1
+
+    def release(self):
+        self.in_use -= 1
+        self._wake()
+
+    def set_limit(self, limit):
+        self.limit = limit
+        self._wake()
+
+    def _wake(self):
+        free = self.limit - self.in_use
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def take_saturated(self):
+        saturated = self._saturated or self.in_use >= self.limit
+        self._saturated = False
+        return saturated
+
+
+class ConcurrencyController:
+    """메모리 여유, CPU 부하, 처리 시간을 주기적으로 확인해서 동시 처리 수를 조정합니다.
+
+    작업마다 slot()으로 실행 권한을 받고, 컨트롤러가 CONTROL_INTERVAL마다 상한을 다시 계산합니다.
+    """
+
+    def __init__(self, name, floor, ceiling, initial=None, interval=CONTROL_INTERVAL,
+                 min_free_memory_mb=MIN_FREE_MEMORY_MB, max_cpu_load=MAX_CPU_LOAD):
+        self.name = name
+        self.interval = interval
+        self.min_free_memory_mb = min_free_memory_mb
+        self.max_cpu_load = max_cpu_load
+        self.aimd = AIMDLimit(floor, ceiling, initial)
+        self.limiter = Limiter(self.aimd.limit)
+        self._stop = threading.Event()
+        self._thread = None
+        self._decreased_at = float('-inf')
+        instrumentation.set_gauge('concurrency_limit', self.limit, kind=name)
+
+    @property
+    def limit(self):
+        return self.limiter.limit
+
+    def acquire(self):
+        self.limiter.acquire()
+
+    def release(self):
+        self.limiter.release()
+
+    def available(self):
+        return self.limiter.available()
+
+    def record(self, seconds):
+        self.aimd.record(seconds)
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def pressure(self):
+        """자원이 부족하면 이유를 반환합니다."""
+        memory = available_memory_mb()
+        if memory is not None and memory < self.min_free_memory_mb:
+            return f"memory {memory:.0f}MB"
+        load = cpu_load()
+        if load is not None and load > self.max_cpu_load:
+            return f"cpu load {load:.2f}"
+        return None
+
+    def adjust(self):
+        before = self.limit
+        reason = self.pressure()
+        saturated = self.limiter.take_saturated()
+        if reason and time.monotonic() - self._decreased_at < PRESSURE_COOLDOWN:
+            # 지난 감소가 아직 반영되지 않았으면 늘리지도 줄이지도 않음
+            limit = self.aimd.update(False)
+        else:
+            limit = self.aimd.update(saturated, pressure=reason is not None)
+        if limit < before:
+            self._decreased_at = time.monotonic()
+        self.limiter.set_limit(limit)
+
+        instrumentation.set_gauge('concurrency_limit', limit, kind=self.name)
+        if limit != before:
+            logger.info(f"{self.name} 동시 처리 수 {before} -> {limit}"
+                        + (f" ({reason})" if reason else ""),
+                        extra={'kind': self.name, 'limit': limit, 'baseline': self.aimd.baseline})
+        return limit
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.adjust()
+            except Exception as e:
+                logger.warning(f"동시 처리 수 조정 실패: {e}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name=f'{self.name}-controller',
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,117 @@
+from concurrent.futures import ProcessPoolExecutor
+import concurrent.futures
+import multiprocessing
+import os
+import threading
+import concurrency
+import database
+
+# 웹 서버(FastAPI)와 분리된 모듈이므로 자식 프로세스가 spawn 되어도 웹 스택을 불러오지 않음
+
+# 기본값 (privateKey.json의 CRAWL_PROCESSES / CRAWL_MIN_CONCURRENCY / CRAWL_MAX_CONCURRENCY로 변경)
+PROCESS_COUNT = min(4, os.cpu_count() or 1)
+THREADS_PER_PROCESS = 8
+# 전체 프로세스를 합친 동시 처리 place 수(= 브라우저 수)의 하한/상한
+MIN_IN_FLIGHT = PROCESS_COUNT
+MAX_IN_FLIGHT = PROCESS_COUNT * THREADS_PER_PROCESS
+
+# 프로세스 간에 공유하는 작업 목록과 다음에 가져갈 위치 (ProcessPoolExecutor initializer로 전달)
+_shared_places = None
+_shared_cursor = None
+
+
+class _Cursor:
+    """place 목록에서 다음 place를 하나씩 꺼내줍니다. (먼저 끝난 스레드가 다음 place를 가져감)"""
+
+    def __init__(self, place_pairs, value=None):
+        self.place_pairs = place_pairs
+        if value is None:
+            # 한 프로세스 안에서만 사용하는 경우
+            value = multiprocessing.RawValue('i', 0)
+            self.lock = threading.Lock()
+        else:
+            self.lock = value.get_lock()
+        self.value = value
+
+    def next(self):
+        with self.lock:
+            index = self.value.value
+            if index >= len(self.place_pairs):
+                return None
+            self.value.value = index + 1
+        return self.place_pairs[index]
+
+
+def _limits(max_in_flight=None):
+    # 전체 하한/상한을 프로세스 수로 나눠서 프로세스별 하한/상한을 정함
+    config = database.get_config()
+    ceiling = max_in_flight or config.get('CRAWL_MAX_CONCURRENCY', MAX_IN_FLIGHT)
+    floor = min(ceiling, config.get('CRAWL_MIN_CONCURRENCY', MIN_IN_FLIGHT))
+    processes = max(1, min(config.get('CRAWL_PROCESSES', PROCESS_COUNT), ceiling))
+    return processes, max(1, floor // processes), max(1, ceiling // processes)
+
+
+def _crawl(cursor, floor, ceiling):
+    # 크롤러 모듈은 실제로 place를 처리하는 프로세스에서만 불러옴
+    import driver_pool
+    import pipeline
+
+    config = database.get_config()
+    controller = concurrency.ConcurrencyController(
+        'crawl', floor, ceiling, initial=max(floor, ceiling // 2),
+        min_free_memory_mb=config.get('MIN_FREE_MEMORY_MB', concurrency.MIN_FREE_MEMORY_MB),
+        max_cpu_load=config.get('MAX_CPU_LOAD', concurrency.MAX_CPU_LOAD))
+
+    # 브라우저는 동시에 수집하는 place 수만큼만 띄워지고 place 간에 재사용됨
+    driver_pool.get_pool(max_size=ceiling)
+
+    # 수집 → 분석 → 저장을 단계별로 나눠 실행 (브라우저는 분석을 기다리지 않음)
+    place_pipeline = pipeline.PlacePipeline(controller)
+    controller.start()
+    place_pipeline.start()
+    try:
+        # 수집 큐에 자리가 날 때마다 공유 목록에서 다음 place를 가져옴
+        while (place := cursor.next()) is not None:
+            place_pipeline.submit(*place)
+        place_pipeline.close()
+    finally:
+        controller.stop()
+
+
+def do_thread_crawl_and_analyze(place_pairs: list, threads: int = THREADS_PER_PROCESS,
+                                min_threads: int = 1):
+    _crawl(_Cursor(place_pairs), min(min_threads, threads), threads)
+
+
+def _init_process(place_pairs, cursor):
+    global _shared_places, _shared_cursor
+
+    _shared_places = place_pairs
+    _shared_cursor = cursor
+
+
+def _process_crawl(floor, ceiling):
+    _crawl(_Cursor(_shared_places, _shared_cursor), floor, ceiling)
+
+
+def do_process_crawl(place_pairs: list, max_in_flight: int = None):
+    """place를 여러 프로세스에서 나눠 처리합니다.
+
+    place를 미리 나눠주지 않고 공유 목록에서 하나씩 가져가므로,
+    오래 걸리는 place가 몰려도 먼저 끝난 프로세스가 남은 place를 이어서 처리합니다.
+    """
+    if not place_pairs:
+        return
+    processes, floor, ceiling = _limits(max_in_flight)
+    processes = min(processes, len(place_pairs))
+
+    context = multiprocessing.get_context()
+    cursor = context.Value('i', 0)
+    process_list = []
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context,
+                             initializer=_init_process,
+                             initargs=(place_pairs, cursor)) as executor:
+        for _ in range(processes):
+            process_list.append(executor.submit(_process_crawl, floor, ceiling))
+        for execution in concurrent.futures.as_completed(process_list):
+            execution.result()
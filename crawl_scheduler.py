@@ -0,0 +1,207 @@
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from datetime import datetime, timedelta
+import statistics
+import threading
+import instrumentation
+import review_state
+
+logger = instrumentation.get_logger('scheduler')
+
+DAY_MAP = ['sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat']
+
+# 하루 중 크롤링을 실행할 시각 (새벽 시간대에 나누어 실행)
+SLOT_HOURS = [1, 2, 3, 4, 5]
+SLOT_SECONDS = 3600
+
+# 측정값이 없는 place의 예상 처리 시간(초)
+DEFAULT_PLACE_COST = 30.0
+# 작업 큐를 처리하는 작업자들의 동시 처리 place 수 합계 (worker.py 프로세스 수 x --threads)
+DEFAULT_WORKER_CAPACITY = 8
+# place 목록을 다시 불러오는 주기(분)
+DEFAULT_REFRESH_MINUTES = 60
+# 가장 바쁜 슬롯이 평균보다 이 비율 이상 크면 일부 place를 옮김
+REBALANCE_THRESHOLD = 0.25
+# 한 주에 다른 슬롯으로 옮길 수 있는 place 비율 (최소 1개)
+REBALANCE_MOVES_PER_WEEK = 0.05
+
+
+class CrawlScheduler:
+    """place를 요일 x 시간 슬롯에 측정된 처리 시간 기준으로 고르게 배분하는 스케줄러.
+
+    배정은 review_state에 저장하며, place 목록을 주기적으로 다시 불러올 때 기존 place는 저장된 슬롯을 유지하고
+    새 place는 가장 여유 있는 슬롯에 배정합니다. 슬롯 사이의 차이가 크면 한 주에 정해진 수만큼만
+    옮기며, 이번 주 실행 여부가 같은 슬롯끼리만 옮겨서 한 주에 두 번 수집되거나 빠지는 place가 없도록 합니다.
+    """
+
+    def __init__(self, scheduler, load_places, enqueue,
+                 slot_hours=SLOT_HOURS, worker_capacity=DEFAULT_WORKER_CAPACITY,
+                 refresh_minutes=DEFAULT_REFRESH_MINUTES):
+        self.scheduler = scheduler
+        self.load_places = load_places
+        self.enqueue = enqueue
+        self.slots = [(day, hour) for day in range(7) for hour in slot_hours]
+        self.worker_capacity = worker_capacity
+        self.refresh_minutes = refresh_minutes
+
+        self.place_nums = {}
+        self.assignment = {}
+        self.costs = {}
+        self._default_cost = DEFAULT_PLACE_COST
+        self._week = None
+        self._moves_left = 0
+        self._lock = threading.Lock()
+
+    def cost(self, place_id):
+        return self.costs.get(place_id, self._default_cost)
+
+    def refresh(self, now=None):
+        now = now or datetime.now()
+        places = self.load_places()
+        costs = review_state.load_costs()
+        # 저장된 배정을 기준으로 함 (재시작해도 place가 주중에 슬롯을 옮기지 않도록)
+        saved = review_state.load_slots()
+
+        with self._lock:
+            self.costs = costs
+            self._default_cost = statistics.median(
+                costs.values()) if costs else DEFAULT_PLACE_COST
+            self.place_nums = {place_id: place_num for place_id, place_num in places}
+
+            # 삭제된 place와 더 이상 없는 슬롯의 배정 제외
+            valid_slots = set(self.slots)
+            self.assignment = {place_id: slot for place_id, slot in saved.items()
+                               if place_id in self.place_nums and slot in valid_slots}
+
+            load = self._slot_loads()
+            new_places = sorted((place_id for place_id in self.place_nums
+                                 if place_id not in self.assignment),
+                                key=lambda place_id: (-self.cost(place_id), place_id))
+            for place_id in new_places:
+                slot = min(self.slots, key=lambda s: (load[s], s))
+                self.assignment[place_id] = slot
+                load[slot] += self.cost(place_id)
+
+            if self._imbalanced(load):
+                self._rebalance(load, now)
+            assignment = dict(self.assignment)
+
+        if assignment != saved:
+            review_state.save_slots(assignment)
+        self.report()
+
+    def _slot_loads(self):
+        load = {slot: 0.0 for slot in self.slots}
+        for place_id, slot in self.assignment.items():
+            load[slot] += self.cost(place_id)
+        return load
+
+    def _imbalanced(self, load):
+        mean = sum(load.values()) / len(load)
+        return mean > 0 and max(load.values()) > mean * (1 + REBALANCE_THRESHOLD)
+
+    @staticmethod
+    def _week_position(now):
+        # (요일, 시) - 요일은 일요일이 0 (crontab과 같음)
+        return (now.weekday() + 1) % 7, now.hour
+
+    def _rebalance(self, load, now):
+        day, hour = self._week_position(now)
+        week = (now - timedelta(days=day)).date()
+        if week != self._week:
+            self._week = week
+            self._moves_left = max(1, int(len(self.place_nums) * REBALANCE_MOVES_PER_WEEK))
+
+        # 이번 주에 이미 시작한 슬롯
+        passed = {slot: slot <= (day, hour) for slot in self.slots}
+        moved = 0
+        while self._moves_left > 0 and self._imbalanced(load):
+            source = max(self.slots, key=lambda s: (load[s], s))
+            targets = [slot for slot in self.slots if passed[slot] == passed[source]]
+            target = min(targets, key=lambda s: (load[s], s))
+            # 옮긴 뒤에도 대상 슬롯이 원래 슬롯보다 가벼워지는 place 중 가장 큰 것
+            candidates = [place_id for place_id, slot in self.assignment.items()
+                          if slot == source and load[target] + self.cost(place_id) < load[source]]
+            if not candidates:
+                break
+            place_id = max(candidates, key=lambda p: (self.cost(p), -p))
+            self.assignment[place_id] = target
+            load[source] -= self.cost(place_id)
+            load[target] += self.cost(place_id)
+            self._moves_left -= 1
+            moved += 1
+
+        if moved:
+            logger.info(f"슬롯 재배분: place {moved}개 이동 (이번 주 남은 이동 {self._moves_left}개)")
+
+    def slot_places(self, day, hour):
+        with self._lock:
+            return sorted((place_id, self.place_nums[place_id])
+                          for place_id, slot in self.assignment.items() if slot == (day, hour))
+
+    def projected_load(self):
+        """슬롯별 place 수, 누적 처리 시간, 작업자 처리 용량 기준 예상 소요 시간을 반환합니다."""
+        with self._lock:
+            counts = {slot: 0 for slot in self.slots}
+            for slot in self.assignment.values():
+                counts[slot] += 1
+            load = self._slot_loads()
+
+        report = []
+        for day, hour in self.slots:
+            seconds = load[(day, hour)]
+            wall_seconds = seconds / self.worker_capacity
+            report.append({
+                'day': DAY_MAP[day],
+                'hour': hour,
+                'places': counts[(day, hour)],
+                'work_seconds': round(seconds, 1),
+                'projected_seconds': round(wall_seconds, 1),
+                'utilization': round(wall_seconds / SLOT_SECONDS, 3),
+            })
+        return report
+
+    def report(self):
+        report = self.projected_load()
+        busiest = max(report, key=lambda r: r['projected_seconds'])
+        logger.info(f"스케줄 갱신: place {len(self.assignment)}개, 슬롯 {len(report)}개, "
+                    f"최대 슬롯 {busiest['day']} {busiest['hour']:02d}시 "
+                    f"({busiest['places']}개, 예상 {busiest['projected_seconds']}초)")
+        for r in report:
+            instrumentation.set_gauge('schedule_slot_projected_seconds', r['projected_seconds'],
+                                      day=r['day'], hour=r['hour'])
+            if r['utilization'] > 1:
+                logger.warning(f"{r['day']} {r['hour']:02d}시 슬롯이 시간 내에 끝나지 않을 수 있습니다.",
+                               extra=r)
+
+    def run_slot(self, day, hour):
+        place_pairs = self.slot_places(day, hour)
+        if not place_pairs:
+            return
+
+        # 작업 큐에 등록만 함 (실행은 worker.py, 이미 대기/실행 중인 place는 건너뜀)
+        logger.info(f"{DAY_MAP[day]} {hour:02d}시 슬롯 등록: place {len(place_pairs)}개")
+        self.enqueue(place_pairs)
+
+    def start(self):
+        self.refresh()
+
+        for day, hour in self.slots:
+            self.scheduler.add_job(
+                self.run_slot,
+                CronTrigger.from_crontab(f"00 {hour:02d} * * {DAY_MAP[day]}"),
+                id=f"day_{day}_{hour:02d}",
+                args=[day, hour],
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True
+            )
+
+        self.scheduler.add_job(
+            self.refresh,
+            IntervalTrigger(minutes=self.refresh_minutes),
+            id="refresh_places",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
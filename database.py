@@ -0,0 +1,93 @@
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import create_engine, Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy.orm import scoped_session, sessionmaker
+import json
+import os
+import threading
+
+# 설정 파일 경로 (기본값은 실행 디렉터리의 privateKey.json)
+CONFIG_PATH = os.environ.get('PRIVATE_KEY_PATH', 'privateKey.json')
+
+_config = None
+_engines = {}
+_session_factories = {}
+_lock = threading.Lock()
+
+
+def get_config():
+    """privateKey.json 설정을 프로세스당 한 번만 읽어서 반환합니다."""
+    global _config
+
+    if _config is None:
+        with _lock:
+            if _config is None:
+                with open(CONFIG_PATH, 'r') as file:
+                    _config = json.load(file)
+    return _config
+
+
+def get_engine(url=None):
+    """URL별 엔진을 처음 사용할 때 만들어서 공유합니다. (기본값은 DATABASE_URL)"""
+    config = get_config()
+    url = url or config['DATABASE_URL']
+
+    engine = _engines.get(url)
+    if engine is None:
+        with _lock:
+            engine = _engines.get(url)
+            if engine is None:
+                # 프로세스당 연결 수 (크롤러 스레드 수에 맞춤)
+                engine = create_engine(url,
+                                       pool_size=config.get('DB_POOL_SIZE', 8),
+                                       max_overflow=config.get('DB_MAX_OVERFLOW', 2),
+                                       pool_pre_ping=True, pool_recycle=3600)
+                _engines[url] = engine
+    return engine
+
+
+def get_sessionmaker(url=None):
+    url = url or get_config()['DATABASE_URL']
+
+    factory = _session_factories.get(url)
+    if factory is None:
+        engine = get_engine(url)
+        with _lock:
+            factory = _session_factories.setdefault(
+                url, sessionmaker(autocommit=False, autoflush=False, bind=engine))
+    return factory
+
+
+# 스레드마다 별도의 세션을 사용 (엔진은 처음 세션을 열 때 생성)
+Session = scoped_session(lambda: get_sessionmaker()())
+
+
+def _dispose_engines():
+    # fork 된 자식 프로세스는 부모의 연결을 재사용하지 않음
+    for engine in list(_engines.values()):
+        engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_dispose_engines)
+
+
+Base = declarative_base()
+
+
+class Place(Base):
+    __tablename__ = 'place'
+
+    place_id = Column(Integer, primary_key=True, index=True)
+    place_num = Column(String)
+
+
+class Feedback(Base):
+    __tablename__ = 'feedback'
+
+    feedback_id = Column(Integer, primary_key=True, autoincrement=True)
+    place_id = Column(Integer, ForeignKey('place.place_id'))
+    p_summary = Column(String)
+    p_body = Column(String)
+    n_summary = Column(String)
+    n_body = Column(String)
+    keyword = Column(String)
+    updated_at = Column(DateTime)
@@ -0,0 +1,182 @@
+from contextlib import contextmanager
+import multiprocessing.util
+import os
+import queue
+import threading
+import instrumentation
+
+logger = instrumentation.get_logger('driver_pool')
+# 프로세스당 동시에 띄울 수 있는 최대 브라우저 수
+DEFAULT_POOL_SIZE = 8
+# 드라이버 하나를 재사용할 최대 횟수 (메모리 누수 방지를 위해 주기적으로 재시작)
+DEFAULT_MAX_USES = 20
+
+
+def _chrome_options():
+    from selenium import webdriver
+
+    options = webdriver.ChromeOptions()
+    options.add_argument('--headless=new')
+    options.add_argument('window-size=1920x1080')
+    options.add_argument("disable-gpu")
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    return options
+
+
+class DriverPool:
+    """프로세스 단위로 재사용하는 headless Chrome 드라이버 풀.
+
+    lease()로 드라이버를 빌려 쓰고, 반납 시 상태를 초기화합니다.
+    max_uses 만큼 사용했거나 사용 중 예외가 난 드라이버는 종료 후 새로 띄웁니다.
+    """
+
+    def __init__(self, max_size=DEFAULT_POOL_SIZE, max_uses=DEFAULT_MAX_USES):
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._driver_path = None
+        self._uses = {}
+        self._all = set()
+        self._closed = False
+
+    def _resolve_driver_path(self):
+        # ChromeDriverManager().install()은 프로세스당 한 번만 호출
+        with self._lock:
+            if self._driver_path is None:
+                from webdriver_manager.chrome import ChromeDriverManager
+                self._driver_path = ChromeDriverManager().install()
+            return self._driver_path
+
+    def _create(self):
+        # selenium은 처음 브라우저를 띄울 때 불러옴 (HTTP 수집만 하는 프로세스는 불러오지 않음)
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service
+
+        # implicit wait 없이 사용하고, 필요한 곳에서 명시적으로 기다림
+        with instrumentation.timer('browser_startup'):
+            driver = webdriver.Chrome(service=Service(self._resolve_driver_path()),
+                                      options=_chrome_options())
+        instrumentation.inc('browser_started_total')
+        with self._lock:
+            self._all.add(driver)
+            self._uses[driver] = 0
+        return driver
+
+    def _destroy(self, driver):
+        with self._lock:
+            self._all.discard(driver)
+            self._uses.pop(driver, None)
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.warning(f"드라이버 종료 오류: {e}")
+
+    def _reset(self, driver):
+        # 다음 place에서 이전 상태가 남지 않도록 쿠키/스토리지/탭 정리
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+        # 스토리지는 크롤링한 페이지(같은 origin)에 있는 동안 비움 (about:blank에서는 접근할 수 없음)
+        origin = driver.execute_script(
+            "try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (e) {}"
+            "return window.location.origin;")
+        if origin and origin.startswith('http'):
+            # IndexedDB, 캐시 스토리지 등 스크립트로 지우지 못한 데이터까지 정리
+            driver.execute_cdp_cmd('Storage.clearDataForOrigin',
+                                   {'origin': origin, 'storageTypes': 'all'})
+        # 현재 도메인뿐 아니라 모든 도메인의 쿠키 삭제
+        driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+        driver.get('about:blank')
+
+    @contextmanager
+    def lease(self):
+        if self._closed:
+            raise RuntimeError("DriverPool이 이미 종료되었습니다.")
+
+        self._slots.acquire()
+        driver = None
+        broken = False
+        try:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                driver = self._create()
+
+            yield driver
+
+        except Exception:
+            broken = True
+            raise
+
+        finally:
+            try:
+                if driver is not None:
+                    self._release(driver, broken)
+            finally:
+                self._slots.release()
+
+    def _release(self, driver, broken):
+        with self._lock:
+            self._uses[driver] = self._uses.get(driver, 0) + 1
+            uses = self._uses[driver]
+
+        if broken or self._closed or uses >= self.max_uses:
+            instrumentation.inc('browser_recycled_total',
+                                reason='error' if broken else 'max_uses' if uses >= self.max_uses else 'shutdown')
+            self._destroy(driver)
+            return
+
+        try:
+            self._reset(driver)
+        except Exception as e:
+            logger.warning(f"드라이버 초기화 실패, 재시작합니다: {e}")
+            self._destroy(driver)
+            return
+
+        self._idle.put(driver)
+
+    def shutdown(self):
+        self._closed = True
+        with self._lock:
+            drivers = list(self._all)
+        for driver in drivers:
+            self._destroy(driver)
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(max_size=DEFAULT_POOL_SIZE, max_uses=DEFAULT_MAX_USES):
+    """현재 프로세스의 DriverPool을 반환합니다. (fork 된 자식은 새 풀을 생성)"""
+    global _pool, _pool_pid
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = DriverPool(max_size=max_size, max_uses=max_uses)
+            _pool_pid = os.getpid()
+            # ProcessPoolExecutor 자식 프로세스는 atexit이 실행되지 않으므로
+            # multiprocessing 종료 훅으로 브라우저를 정리
+            multiprocessing.util.Finalize(
+                None, _pool.shutdown, exitpriority=10)
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
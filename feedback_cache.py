@@ -0,0 +1,128 @@
+from sqlalchemy import select
+import hashlib
+import os
+import database
+import instrumentation
+from database import Feedback
+from ttl_cache import TTLCache
+
+config = database.get_config()
+
+# 분석 결과는 place당 일주일에 한 번 정도 바뀌므로 길게 보관 (갱신 시 무효화)
+FEEDBACK_CACHE_TTL = config.get('FEEDBACK_CACHE_TTL', 600)
+FEEDBACK_CACHE_SIZE = config.get('FEEDBACK_CACHE_SIZE', 10000)
+
+# 다른 프로세스(작업자 등)가 결과를 저장했음을 알리는 파일 (수정 시각이 바뀌면 캐시를 비움)
+STAMP_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'files', 'feedback.stamp')
+
+FIELDS = ('p_summary', 'n_summary', 'keyword', 'p_body', 'n_body')
+
+_cache = TTLCache(maxsize=FEEDBACK_CACHE_SIZE, ttl=FEEDBACK_CACHE_TTL)
+_seen_stamp = None
+# feedback이 없는 place도 캐시 (매번 조회하지 않도록)
+_NOT_FOUND = object()
+
+
+def _stamp():
+    try:
+        return os.stat(STAMP_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def _check_stamp():
+    global _seen_stamp
+
+    stamp = _stamp()
+    if stamp != _seen_stamp:
+        _cache.clear()
+        _seen_stamp = stamp
+
+
+def invalidate(place_ids):
+    """저장된 place의 캐시를 지우고 다른 프로세스에도 알립니다."""
+    for place_id in place_ids:
+        _cache.pop(place_id)
+    try:
+        os.makedirs(os.path.dirname(STAMP_PATH), exist_ok=True)
+        with open(STAMP_PATH, 'a'):
+            os.utime(STAMP_PATH)
+    except OSError:
+        pass
+
+
+def _row(feedback):
+    result = {field: getattr(feedback, field) for field in FIELDS}
+    result['updated_at'] = feedback.updated_at
+    return result
+
+
+def _load(place_ids):
+    # 여러 place를 한 번의 쿼리로 조회 (place당 첫 번째 행 사용)
+    session = database.Session()
+    try:
+        rows = session.execute(
+            select(Feedback)
+            .where(Feedback.place_id.in_(place_ids))
+            .order_by(Feedback.feedback_id)).scalars().all()
+    finally:
+        database.Session.remove()
+
+    found = {}
+    for feedback in rows:
+        found.setdefault(feedback.place_id, _row(feedback))
+    return found
+
+
+def get_many(place_ids):
+    """place_id별 feedback을 반환합니다. 캐시에 없는 place만 한 번에 조회하며, 없는 place는 결과에서 빠집니다."""
+    _check_stamp()
+
+    place_ids = list(dict.fromkeys(place_ids))
+    result = {}
+    missing = []
+    for place_id in place_ids:
+        cached = _cache.get(place_id)
+        if cached is None:
+            missing.append(place_id)
+        elif cached is not _NOT_FOUND:
+            result[place_id] = cached
+    if len(missing) < len(place_ids):
+        instrumentation.inc('feedback_cache_total', len(place_ids) - len(missing), outcome='hit')
+
+    if missing:
+        instrumentation.inc('feedback_cache_total', len(missing), outcome='miss')
+        loaded = _load(missing)
+        for place_id in missing:
+            value = loaded.get(place_id)
+            _cache.set(place_id, _NOT_FOUND if value is None else value)
+            if value is not None:
+                result[place_id] = value
+    return result
+
+
+def get(place_id):
+    return get_many([place_id]).get(place_id)
+
+
+def etag(items):
+    """(place_id, feedback) 목록의 updated_at으로 ETag를 만듭니다."""
+    h = hashlib.sha1()
+    for place_id, feedback in items:
+        updated_at = feedback['updated_at'] if feedback else None
+        h.update(f"{place_id}:{updated_at.isoformat() if updated_at else '-'}\n".encode('utf-8'))
+    return f'"{h.hexdigest()[:20]}"'
+
+
+def etag_matches(if_none_match, tag):
+    if not if_none_match:
+        return False
+    candidates = [t.strip() for t in if_none_match.split(',')]
+    # 약한 비교 (W/ 접두사 무시)
+    return '*' in candidates or tag in [t[2:] if t.startswith('W/') else t for t in candidates]
+
+
+def serialize(place_id, feedback):
+    return dict(feedback, place_id=place_id,
+                updated_at=feedback['updated_at'].isoformat() if feedback['updated_at'] else None)
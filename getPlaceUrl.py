@@ -1,26 +1,128 @@
-from selenium import webdriver
-from webdriver_manager.chrome import ChromeDriverManager
+from concurrent.futures import ThreadPoolExecutor
+from ttl_cache import TTLCache
+import asyncio
 import re
+import threading
+import requests
+import instrumentation
 
+logger = instrumentation.get_logger('place_url')
+
+PLACE_NUM_PATTERN = re.compile(r"place/(\d+)")
+
+HTTP_TIMEOUT = (5, 10)
+HTTP_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) "
+                  "AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1",
+}
+BROWSER_TIMEOUT = 30
+
+# 동시에 처리할 조회 수 / 웹 프로세스에서 띄울 브라우저 수
+RESOLVE_CONCURRENCY = 4
+BROWSER_POOL_SIZE = 2
+
+# url -> place_num 캐시
+_cache = TTLCache(maxsize=4096, ttl=24 * 3600)
+
+# 같은 url에 대한 동시 요청을 하나로 합치기 위한 진행 중 조회 목록
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+_executor = ThreadPoolExecutor(max_workers=RESOLVE_CONCURRENCY,
+                               thread_name_prefix='place-url')
+_session = requests.Session()
+_session.headers.update(HTTP_HEADERS)
 
-def getUrl(url: str):
-    try:
-        options = webdriver.ChromeOptions()
-        options.add_argument('headless')
-        options.add_argument('window-size=1920x1080')
-        options.add_argument("disable-gpu")
 
-        ChromeDriverManager().install()
+def _find_place_num(text):
+    res_code = PLACE_NUM_PATTERN.findall(text or '')
+    if res_code:
+        return res_code[0]
 
-        driver = webdriver.Chrome(options=options)
+
+def _resolve_http(url):
+    # 리다이렉트를 따라가며 중간/최종 url에서 place 번호를 찾음
+    r = _session.get(url, allow_redirects=True, timeout=HTTP_TIMEOUT)
+    for hop in [*r.history, r]:
+        place_num = _find_place_num(hop.url) or _find_place_num(
+            hop.headers.get('Location'))
+        if place_num:
+            return place_num
+
+    # JS로 이동하는 페이지는 본문에 최종 url이 들어있는 경우가 있음
+    return _find_place_num(r.text)
+
+
+def _resolve_browser(url):
+    # HTTP로 찾지 못한 경우에만 브라우저를 사용하므로 이때 불러옴
+    from selenium.webdriver.support.ui import WebDriverWait
+    import driver_pool
+
+    with driver_pool.get_pool(max_size=BROWSER_POOL_SIZE).lease() as driver:
         driver.get(url)
-        driver.implicitly_wait(30)
+        WebDriverWait(driver, BROWSER_TIMEOUT).until(
+            lambda d: PLACE_NUM_PATTERN.search(d.current_url))
+        return _find_place_num(driver.current_url)
+
 
-        cu = driver.current_url
-        res_code = re.findall(r"place/(\d+)", cu)
+def _resolve(url):
+    try:
+        place_num = _resolve_http(url)
+        if place_num:
+            return place_num
+    except requests.RequestException as e:
+        logger.warning(f"HTTP 조회 실패, 브라우저로 재시도: {e}")
 
+    return _resolve_browser(url)
+
+
+def _lookup(url):
+    place_num = None
+    try:
+        with instrumentation.timer('place_url_resolve'):
+            place_num = _resolve(url)
+        if place_num:
+            _cache.set(url, place_num)
     except Exception as e:
-        print(e)
-        return
+        instrumentation.inc('place_url_failures_total')
+        logger.error(f"place 번호 조회 실패: {e}", extra={'url': url})
+    return place_num
+
+
+def _done(url, future):
+    with _inflight_lock:
+        if _inflight.get(url) is future:
+            del _inflight[url]
+
+
+def _submit(url):
+    """url 조회를 스레드 풀에 넣습니다. 같은 url을 조회 중이면 진행 중인 Future를 그대로 반환합니다."""
+    with _inflight_lock:
+        future = _inflight.get(url)
+        if future is not None:
+            return future
+        future = _executor.submit(_lookup, url)
+        _inflight[url] = future
+    # 이미 끝났으면 바로 호출되므로 잠금 밖에서 등록
+    future.add_done_callback(lambda f: _done(url, f))
+    return future
+
+
+def _cached(url):
+    place_num = _cache.get(url)
+    if place_num:
+        instrumentation.inc('place_url_cache_hits_total')
+        return place_num
+    instrumentation.inc('place_url_cache_misses_total')
+
+
+def getUrl(url: str):
+    return _cached(url) or _submit(url).result()
+
+
+async def getUrlAsync(url: str):
+    """이벤트 루프를 막지 않도록 별도 스레드 풀에서 조회합니다.
 
-    return res_code[0]
+    같은 url을 조회 중이면 첫 요청만 스레드 풀에서 실행하고, 나머지는 스레드를 차지하지 않고 그 결과를 기다립니다.
+    """
+    return _cached(url) or await asyncio.wrap_future(_submit(url))
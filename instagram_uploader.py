@@ -0,0 +1,130 @@
+from concurrent.futures import ThreadPoolExecutor
+from ttl_cache import TTLCache
+import asyncio
+import hashlib
+import os
+import threading
+import uuid
+import instrumentation
+
+# 동시에 실행할 업로드 수
+UPLOAD_WORKERS = 4
+# 로그인된 세션을 메모리에 유지하는 시간(초)
+SESSION_TTL = 6 * 3600
+# 백그라운드 업로드 결과를 보관하는 시간(초)
+JOB_TTL = 24 * 3600
+
+SESSION_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'files', 'instagram_sessions')
+
+logger = instrumentation.get_logger('instagram')
+
+_executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS,
+                               thread_name_prefix='instagram')
+_clients = TTLCache(maxsize=256, ttl=SESSION_TTL)
+_jobs = TTLCache(maxsize=4096, ttl=JOB_TTL)
+
+# 계정별 잠금 (같은 계정으로 동시에 로그인/업로드하지 않도록)
+_account_locks = {}
+_account_locks_lock = threading.Lock()
+
+
+def _account_key(instagram_id):
+    return hashlib.sha256(instagram_id.encode('utf-8')).hexdigest()[:32]
+
+
+def _session_key(instagram_id, instagram_pw):
+    # 비밀번호가 바뀌면 기존 세션을 재사용하지 않음
+    return hashlib.sha256(f"{instagram_id}\0{instagram_pw}".encode('utf-8')).hexdigest()
+
+
+def _settings_path(instagram_id):
+    return os.path.join(SESSION_DIR, _account_key(instagram_id) + '.json')
+
+
+def _account_lock(instagram_id):
+    with _account_locks_lock:
+        return _account_locks.setdefault(instagram_id, threading.Lock())
+
+
+def _login(instagram_id, instagram_pw):
+    # instagrapi는 처음 업로드할 때 불러옴 (웹 서버 시작 시간 단축)
+    from instagrapi import Client
+
+    cl = Client()
+
+    # 저장된 세션 설정이 있으면 불러와서 새 로그인 대신 기존 세션을 이어서 사용
+    settings_path = _settings_path(instagram_id)
+    if os.path.exists(settings_path):
+        try:
+            cl.load_settings(settings_path)
+        except Exception as e:
+            logger.warning(f"인스타그램 세션 설정을 불러오지 못했습니다: {e}")
+            cl = Client()
+
+    with instrumentation.timer('instagram_login'):
+        cl.login(instagram_id, instagram_pw)
+    instrumentation.inc('instagram_logins_total')
+
+    # 세션 쿠키가 들어 있으므로 소유자만 읽을 수 있도록 함
+    os.makedirs(SESSION_DIR, mode=0o700, exist_ok=True)
+    cl.dump_settings(settings_path)
+    os.chmod(settings_path, 0o600)
+    return cl
+
+
+def _get_client(instagram_id, instagram_pw, refresh=False):
+    key = _session_key(instagram_id, instagram_pw)
+    cl = None if refresh else _clients.get(key)
+    if cl is None:
+        if refresh and os.path.exists(_settings_path(instagram_id)):
+            os.remove(_settings_path(instagram_id))
+        cl = _login(instagram_id, instagram_pw)
+        _clients.set(key, cl)
+    return cl
+
+
+def upload_photo(instagram_id, instagram_pw, file_path, content):
+    """로그인된 세션을 재사용해서 사진을 업로드하고 임시 파일을 삭제합니다."""
+    from instagrapi.exceptions import LoginRequired
+
+    try:
+        with _account_lock(instagram_id):
+            cl = _get_client(instagram_id, instagram_pw)
+            try:
+                with instrumentation.timer('instagram_upload'):
+                    cl.photo_upload(file_path, content)
+            except LoginRequired:
+                # 세션이 만료되었으면 한 번만 다시 로그인해서 재시도
+                cl = _get_client(instagram_id, instagram_pw, refresh=True)
+                cl.photo_upload(file_path, content)
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+
+async def upload_photo_async(instagram_id, instagram_pw, file_path, content):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _executor, upload_photo, instagram_id, instagram_pw, file_path, content)
+
+
+def submit_upload(instagram_id, instagram_pw, file_path, content):
+    """업로드를 백그라운드로 실행하고 작업 id를 바로 반환합니다."""
+    job_id = uuid.uuid4().hex
+    _jobs.set(job_id, {'status': 'queued'})
+
+    def run():
+        _jobs.set(job_id, {'status': 'running'})
+        try:
+            upload_photo(instagram_id, instagram_pw, file_path, content)
+            _jobs.set(job_id, {'status': 'done'})
+        except Exception as e:
+            _jobs.set(job_id, {'status': 'failed', 'error': str(e)})
+
+    _executor.submit(run)
+    return job_id
+
+
+def get_job(job_id):
+    return _jobs.get(job_id)
@@ -0,0 +1,352 @@
+from contextlib import contextmanager
+import bisect
+import collections
+import json
+import logging
+import multiprocessing.util
+import os
+import threading
+import time
+
+# 프로세스별 측정값을 모아두는 디렉터리 (/metrics에서 합산)
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'files', 'metrics'))
+METRICS_FLUSH_SECONDS = 10
+
+# 단계별 소요 시간 히스토그램 구간(초)
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# place별 단계 소요 시간을 보관할 최대 place 수 (측정값과 별도로, 오래된 place부터 지움)
+PLACE_STAGES_MAX = 1000
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+
+_STANDARD_ATTRS = set(logging.LogRecord(
+    '', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """로그를 한 줄짜리 JSON으로 출력합니다. extra로 넘긴 값은 필드로 포함됩니다."""
+
+    def format(self, record):
+        data = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'pid': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+_logging_configured = False
+_logging_lock = threading.Lock()
+
+
+def setup_logging():
+    global _logging_configured
+
+    with _logging_lock:
+        if _logging_configured:
+            return
+        handler = logging.StreamHandler()
+        handler.setFormatter(JsonFormatter())
+        logger = logging.getLogger('app')
+        logger.addHandler(handler)
+        logger.setLevel(LOG_LEVEL)
+        logger.propagate = False
+        _logging_configured = True
+
+
+def get_logger(name):
+    setup_logging()
+    return logging.getLogger('app.' + name)
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+class Registry:
+    """프로세스 안의 카운터/게이지/히스토그램 저장소."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        # place별 단계 소요 시간 (/metrics에는 내보내지 않음)
+        self.places = collections.OrderedDict()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.gauges[key] = value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = {'buckets': list(buckets), 'counts': [0] * (len(buckets) + 1),
+                        'sum': 0.0, 'count': 0}
+                self.histograms[key] = hist
+            hist['counts'][bisect.bisect_left(hist['buckets'], value)] += 1
+            hist['sum'] += value
+            hist['count'] += 1
+
+    def record_place_stage(self, place_id, stage, value):
+        with self._lock:
+            stages = self.places.pop(place_id, None) or {}
+            stages[stage] = value
+            self.places[place_id] = stages
+            while len(self.places) > PLACE_STAGES_MAX:
+                self.places.popitem(last=False)
+
+    def place_stages(self, place_id):
+        with self._lock:
+            return dict(self.places.get(place_id, {}))
+
+    def reset_place_stages(self, place_id):
+        with self._lock:
+            self.places.pop(place_id, None)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, list(map(list, labels)), value]
+                             for (name, labels), value in self.counters.items()],
+                'gauges': [[name, list(map(list, labels)), value]
+                           for (name, labels), value in self.gauges.items()],
+                'histograms': [[name, list(map(list, labels)), dict(hist, counts=list(hist['counts']))]
+                               for (name, labels), hist in self.histograms.items()],
+            }
+
+
+_registry = Registry()
+_registry_pid = os.getpid()
+_flusher_started = False
+_flusher_lock = threading.Lock()
+
+
+def registry():
+    global _registry, _registry_pid, _flusher_started
+
+    # fork 된 자식 프로세스는 자신의 측정값만 기록
+    if _registry_pid != os.getpid():
+        with _flusher_lock:
+            if _registry_pid != os.getpid():
+                _registry = Registry()
+                _registry_pid = os.getpid()
+                _flusher_started = False
+    _start_flusher()
+    return _registry
+
+
+def _snapshot_path(pid):
+    return os.path.join(METRICS_DIR, f"{pid}.json")
+
+
+def flush():
+    """현재 프로세스의 측정값을 파일로 기록합니다."""
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = _snapshot_path(os.getpid())
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(_registry.snapshot(), f)
+    os.replace(tmp_path, path)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        try:
+            flush()
+        except OSError:
+            pass
+
+
+def _start_flusher():
+    global _flusher_started
+
+    if _flusher_started:
+        return
+    with _flusher_lock:
+        if _flusher_started:
+            return
+        threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True).start()
+        # ProcessPoolExecutor 자식도 종료 시 마지막 값을 기록
+        multiprocessing.util.Finalize(None, flush, exitpriority=0)
+        _flusher_started = True
+
+
+def inc(name, value=1, **labels):
+    registry().inc(name, value, **labels)
+
+
+def set_gauge(name, value, **labels):
+    registry().set_gauge(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    registry().observe(name, value, **labels)
+
+
+@contextmanager
+def timer(stage, place_id=None, **labels):
+    """단계 소요 시간을 히스토그램(단계별)과 place별 기록(place_stages)에 남깁니다."""
+    started_at = time.perf_counter()
+    outcome = 'ok'
+    try:
+        yield
+    except BaseException:
+        outcome = 'error'
+        raise
+    finally:
+        elapsed = time.perf_counter() - started_at
+        observe('pipeline_stage_seconds', elapsed, stage=stage, **labels)
+        if outcome == 'error':
+            inc('pipeline_stage_failures_total', stage=stage, **labels)
+        if place_id is not None:
+            registry().record_place_stage(place_id, stage, elapsed)
+        get_logger('timing').debug('stage finished', extra={
+            'stage': stage, 'place_id': place_id, 'seconds': round(elapsed, 4),
+            'outcome': outcome, **labels})
+
+
+def record_place_stage(place_id, stage, seconds):
+    registry().record_place_stage(place_id, stage, seconds)
+
+
+def place_stages(place_id):
+    """현재 프로세스에서 마지막으로 기록된 place의 단계별 소요 시간(초)을 반환합니다."""
+    return registry().place_stages(place_id)
+
+
+def reset_place_stages(place_id):
+    registry().reset_place_stages(place_id)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def cleanup_dead():
+    """이미 종료된 프로세스의 측정 파일을 삭제합니다. (웹 서버 시작 시 호출)"""
+    if not os.path.isdir(METRICS_DIR):
+        return
+    for name in os.listdir(METRICS_DIR):
+        pid = name.split('.')[0]
+        if pid.isdigit() and int(pid) != os.getpid() and not _pid_alive(int(pid)):
+            os.remove(os.path.join(METRICS_DIR, name))
+
+
+def collect():
+    """모든 프로세스(현재 프로세스 + 파일로 기록된 다른 프로세스)의 측정값을 합칩니다."""
+    snapshots = [(os.getpid(), registry().snapshot())]
+    if os.path.isdir(METRICS_DIR):
+        for name in os.listdir(METRICS_DIR):
+            if not name.endswith('.json'):
+                continue
+            pid = int(name[:-5])
+            if pid == os.getpid():
+                continue
+            try:
+                with open(os.path.join(METRICS_DIR, name)) as f:
+                    snapshots.append((pid, json.load(f)))
+            except (OSError, ValueError):
+                continue
+
+    counters, gauges, histograms = {}, {}, {}
+    for pid, snapshot in snapshots:
+        alive = pid == os.getpid() or _pid_alive(pid)
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        # 게이지는 살아있는 프로세스 값만 사용 (같은 키는 마지막 값)
+        if alive:
+            for name, labels, value in snapshot['gauges']:
+                gauges[(name, tuple(map(tuple, labels)))] = value
+        for name, labels, hist in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.get(key)
+            if merged is None:
+                histograms[key] = dict(hist, counts=list(hist['counts']))
+            else:
+                merged['counts'] = [a + b for a, b in zip(merged['counts'], hist['counts'])]
+                merged['sum'] += hist['sum']
+                merged['count'] += hist['count']
+    return counters, gauges, histograms
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ''
+    escaped = [(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+               for k, v in items]
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+
+def render_prometheus():
+    counters, gauges, histograms = collect()
+    lines = []
+
+    for kind, values in (('counter', counters), ('gauge', gauges)):
+        seen = set()
+        for (name, labels), value in sorted(values.items()):
+            if name not in seen:
+                lines.append(f"# TYPE {name} {kind}")
+                seen.add(name)
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    seen = set()
+    for (name, labels), hist in sorted(histograms.items()):
+        if name not in seen:
+            lines.append(f"# TYPE {name} histogram")
+            seen.add(name)
+        cumulative = 0
+        for bound, count in zip(hist['buckets'] + ['+Inf'], hist['counts']):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {hist['sum']}")
+        lines.append(f"{name}_count{_format_labels(labels)} {hist['count']}")
+
+    return '\n'.join(lines) + '\n'
+
+
+def histogram_quantile(q, hist):
+    """히스토그램 구간에서 분위수를 선형 보간으로 추정합니다. (Prometheus histogram_quantile과 동일)"""
+    total = hist['count']
+    if not total:
+        return None
+
+    rank = q * total
+    cumulative = 0
+    lower = 0.0
+    for bound, count in zip(hist['buckets'] + [float('inf')], hist['counts']):
+        if cumulative + count >= rank:
+            if bound == float('inf'):
+                return lower
+            if count == 0:
+                return bound
+            return lower + (bound - lower) * (rank - cumulative) / count
+        cumulative += count
+        lower = bound
+    return lower
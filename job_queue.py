@@ -0,0 +1,327 @@
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import and_, func, inspect, or_, select, text, update, Column, DateTime, Index, Integer, String, Text
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta, timezone
+import json
+import random
+import database
+import instrumentation
+
+config = database.get_config()
+
+# 작업 큐는 기본적으로 서비스 DB를 사용 (JOB_QUEUE_URL로 분리 가능)
+JOB_QUEUE_URL = config.get('JOB_QUEUE_URL', config['DATABASE_URL'])
+
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 5
+# 재시도 대기 시간: BACKOFF_BASE * 2^(시도 횟수 - 1), 최대 BACKOFF_MAX (+ 지터)
+BACKOFF_BASE = 60
+BACKOFF_MAX = 3600
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+logger = instrumentation.get_logger('job_queue')
+
+Base = declarative_base()
+
+
+class CrawlJob(Base):
+    __tablename__ = 'crawl_job'
+
+    job_id = Column(Integer, primary_key=True, autoincrement=True)
+    place_id = Column(Integer, nullable=False, index=True)
+    place_num = Column(String(64), nullable=False)
+    status = Column(String(16), nullable=False, default=QUEUED)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=DEFAULT_MAX_ATTEMPTS)
+    run_after = Column(DateTime, nullable=False)
+    lease_owner = Column(String(128))
+    lease_expires_at = Column(DateTime)
+    last_error = Column(Text)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime)
+    # 마지막으로 임대된 시각과 그 실행의 단계별 소요 시간(초, JSON)
+    started_at = Column(DateTime)
+    stages = Column(Text)
+    # 대기/실행 중인 작업만 place_id를 가짐 (끝나면 NULL) - place당 진행 중 작업을 하나로 제한
+    active_place_id = Column(Integer)
+
+    __table_args__ = (
+        Index('ix_crawl_job_status_run_after', 'status', 'run_after'),
+        # NULL은 중복으로 보지 않으므로 부분 인덱스를 지원하지 않는 DB에서도 동작
+        Index('ux_crawl_job_active_place', 'active_place_id', unique=True),
+    )
+
+
+def _session():
+    # 같은 URL이면 서비스 DB와 엔진(연결 풀)을 공유
+    return database.get_sessionmaker(JOB_QUEUE_URL)()
+
+
+def _now():
+    # DB에는 UTC 기준 naive datetime으로 저장
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def init_db():
+    engine = database.get_engine(JOB_QUEUE_URL)
+    Base.metadata.create_all(engine, tables=[CrawlJob.__table__])
+    _add_columns(engine)
+    _add_active_place_id(engine)
+
+
+def _add_columns(engine):
+    # 나중에 추가된 컬럼이 기존 테이블에 없으면 추가
+    existing = {c['name'] for c in inspect(engine).get_columns('crawl_job')}
+    with engine.begin() as conn:
+        for column in (CrawlJob.started_at, CrawlJob.stages):
+            if column.name not in existing:
+                conn.execute(text(f"ALTER TABLE crawl_job ADD COLUMN {column.name} "
+                                  f"{column.type.compile(dialect=engine.dialect)}"))
+                logger.info(f"crawl_job 테이블에 {column.name} 컬럼 추가")
+
+
+def _add_active_place_id(engine):
+    # active_place_id 컬럼이 없던 기존 테이블에 컬럼과 유니크 인덱스 추가
+    if 'active_place_id' in {c['name'] for c in inspect(engine).get_columns('crawl_job')}:
+        return
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE crawl_job ADD COLUMN active_place_id INTEGER"))
+        # 이미 중복으로 들어간 진행 중 작업은 place당 가장 오래된 작업만 표시
+        first = conn.execute(
+            select(func.min(CrawlJob.job_id))
+            .where(CrawlJob.status.in_([QUEUED, RUNNING]))
+            .group_by(CrawlJob.place_id)).scalars().all()
+        if first:
+            conn.execute(update(CrawlJob).where(CrawlJob.job_id.in_(first))
+                         .values(active_place_id=CrawlJob.place_id))
+    for index in CrawlJob.__table__.indexes:
+        if index.name == 'ux_crawl_job_active_place':
+            index.create(engine)
+    logger.info("crawl_job 테이블에 active_place_id 컬럼 추가")
+
+
+def backoff_seconds(attempts):
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** max(attempts - 1, 0))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _new_job(place_id, place_num, run_after, max_attempts, now):
+    return CrawlJob(place_id=place_id, place_num=str(place_num), status=QUEUED,
+                    attempts=0, max_attempts=max_attempts, run_after=run_after or now,
+                    created_at=now, updated_at=now, active_place_id=place_id)
+
+
+def enqueue(place_pairs, run_after=None, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """place 작업을 큐에 넣습니다. 이미 대기 중이거나 실행 중인 place는 건너뜁니다."""
+    now = _now()
+    session = _session()
+    try:
+        active = set(session.execute(
+            select(CrawlJob.place_id).where(CrawlJob.active_place_id.isnot(None))).scalars())
+        pending = {}
+        for place_id, place_num in place_pairs:
+            if place_id not in active:
+                pending.setdefault(place_id, place_num)
+
+        try:
+            session.add_all([_new_job(place_id, place_num, run_after, max_attempts, now)
+                             for place_id, place_num in pending.items()])
+            session.commit()
+            added = len(pending)
+        except IntegrityError:
+            # 다른 프로세스가 그 사이에 같은 place를 등록함 - 한 건씩 다시 넣고 중복은 건너뜀
+            session.rollback()
+            added = 0
+            for place_id, place_num in pending.items():
+                session.add(_new_job(place_id, place_num, run_after, max_attempts, now))
+                try:
+                    session.commit()
+                    added += 1
+                except IntegrityError:
+                    session.rollback()
+    finally:
+        session.close()
+
+    instrumentation.inc('jobs_enqueued_total', added)
+    logger.info(f"작업 {added}건 등록 (요청 {len(place_pairs)}건)")
+    return added
+
+
+def _claimable(now):
+    return or_(
+        and_(CrawlJob.status == QUEUED, CrawlJob.run_after <= now),
+        # 임대 기간이 끝난 실행 중 작업은 작업자가 죽은 것으로 보고 다시 가져감
+        and_(CrawlJob.status == RUNNING, CrawlJob.lease_expires_at < now,
+             CrawlJob.attempts < CrawlJob.max_attempts),
+    )
+
+
+def _fail_exhausted(session, now):
+    # 재시도 횟수를 모두 쓴 채로 임대가 만료된 작업은 실패 처리
+    session.execute(
+        update(CrawlJob)
+        .where(CrawlJob.status == RUNNING, CrawlJob.lease_expires_at < now,
+               CrawlJob.attempts >= CrawlJob.max_attempts)
+        .values(status=FAILED, lease_owner=None, finished_at=now, updated_at=now,
+                last_error='lease expired', active_place_id=None))
+
+
+def claim(owner, limit, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """실행 가능한 작업을 최대 limit개 임대합니다. 다른 작업자와 경쟁해도 한 작업은 한 곳에서만 가져갑니다."""
+    now = _now()
+    lease_until = now + timedelta(seconds=lease_seconds)
+    session = _session()
+    try:
+        _fail_exhausted(session, now)
+        session.commit()
+
+        candidates = session.execute(
+            select(CrawlJob.job_id).where(_claimable(now))
+            .order_by(CrawlJob.run_after, CrawlJob.job_id).limit(limit * 2)).scalars().all()
+
+        claimed = []
+        for job_id in candidates:
+            if len(claimed) >= limit:
+                break
+
+            # 조건부 UPDATE로 선점 (다른 작업자가 먼저 가져갔으면 rowcount 0)
+            result = session.execute(
+                update(CrawlJob)
+                .where(CrawlJob.job_id == job_id, _claimable(now))
+                .values(status=RUNNING, lease_owner=owner, lease_expires_at=lease_until,
+                        attempts=CrawlJob.attempts + 1, started_at=now, updated_at=now))
+            session.commit()
+            if result.rowcount == 1:
+                claimed.append(job_id)
+
+        if not claimed:
+            return []
+        return session.execute(
+            select(CrawlJob).where(CrawlJob.job_id.in_(claimed))
+            .order_by(CrawlJob.run_after, CrawlJob.job_id)).scalars().all()
+    finally:
+        session.close()
+
+
+def heartbeat(owner, job_ids, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """실행 중인 작업의 임대 기간을 연장합니다."""
+    if not job_ids:
+        return 0
+
+    now = _now()
+    session = _session()
+    try:
+        result = session.execute(
+            update(CrawlJob)
+            .where(CrawlJob.job_id.in_(job_ids), CrawlJob.lease_owner == owner,
+                   CrawlJob.status == RUNNING)
+            .values(lease_expires_at=now + timedelta(seconds=lease_seconds), updated_at=now))
+        session.commit()
+        return result.rowcount
+    finally:
+        session.close()
+
+
+def _dump_stages(stages):
+    return json.dumps({stage: round(seconds, 3) for stage, seconds in stages.items()}) \
+        if stages else None
+
+
+def complete(job_id, owner, stages=None):
+    now = _now()
+    session = _session()
+    try:
+        session.execute(
+            update(CrawlJob)
+            .where(CrawlJob.job_id == job_id, CrawlJob.lease_owner == owner)
+            .values(status=DONE, lease_owner=None, lease_expires_at=None,
+                    finished_at=now, updated_at=now, active_place_id=None,
+                    stages=_dump_stages(stages)))
+        session.commit()
+    finally:
+        session.close()
+
+
+def fail(job_id, owner, error, stages=None):
+    """실패한 작업을 백오프 후 재시도하도록 되돌리거나, 재시도 횟수를 다 쓴 경우 실패 처리합니다."""
+    now = _now()
+    session = _session()
+    try:
+        job = session.get(CrawlJob, job_id)
+        if job is None or job.lease_owner != owner:
+            return
+
+        job.last_error = str(error)[:2000]
+        job.stages = _dump_stages(stages)
+        job.lease_owner = None
+        job.lease_expires_at = None
+        job.updated_at = now
+        if job.attempts >= job.max_attempts:
+            job.status = FAILED
+            job.finished_at = now
+            job.active_place_id = None
+        else:
+            job.status = QUEUED
+            job.run_after = now + timedelta(seconds=backoff_seconds(job.attempts))
+        session.commit()
+    finally:
+        session.close()
+
+
+def defer(job_id, owner, delay_seconds, reason):
+    """외부 장애로 실행하지 못한 작업을 재시도 횟수를 쓰지 않고 delay_seconds 뒤에 다시 실행하도록 되돌립니다."""
+    now = _now()
+    session = _session()
+    try:
+        session.execute(
+            update(CrawlJob)
+            .where(CrawlJob.job_id == job_id, CrawlJob.lease_owner == owner,
+                   CrawlJob.status == RUNNING)
+            # 임대할 때 늘린 시도 횟수를 되돌림
+            .values(status=QUEUED, attempts=CrawlJob.attempts - 1, lease_owner=None,
+                    lease_expires_at=None, last_error=str(reason)[:2000], updated_at=now,
+                    run_after=now + timedelta(seconds=max(delay_seconds, 1))))
+        session.commit()
+    finally:
+        session.close()
+
+
+def get_job(job_id):
+    session = _session()
+    try:
+        return session.get(CrawlJob, job_id)
+    finally:
+        session.close()
+
+
+def latest_job(place_id):
+    """place의 가장 최근 작업을 반환합니다. (대기/실행 중인 작업이 있으면 그 작업)"""
+    session = _session()
+    try:
+        job = session.execute(
+            select(CrawlJob).where(CrawlJob.active_place_id == place_id)).scalar_one_or_none()
+        if job is None:
+            job = session.execute(
+                select(CrawlJob).where(CrawlJob.place_id == place_id)
+                .order_by(CrawlJob.job_id.desc()).limit(1)).scalar_one_or_none()
+        return job
+    finally:
+        session.close()
+
+
+def counts():
+    session = _session()
+    try:
+        rows = session.execute(
+            select(CrawlJob.status, func.count()).group_by(CrawlJob.status)).all()
+    finally:
+        session.close()
+
+    result = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+    result.update(dict(rows))
+    return result
@@ -1,104 +1,63 @@
-import pandas as pd
 import json
-import os
 from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
-from pydantic import BaseModel
-from sqlalchemy import create_engine, Column, Integer, String, select
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import select
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.cron import CronTrigger
-from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from starlette.concurrency import run_in_threadpool
 from tempfile import NamedTemporaryFile
 
-# instagram upload
-from instagrapi import Client
-
-import concurrent.futures
-import importlib.util
-import subprocess
+import shutil
+import analyze_jobs
+import database
+import feedback_cache
 import getPlaceUrl
+import crawl_scheduler
+import job_queue
+import instagram_uploader
+import instrumentation
+from database import Place
+# 크롤링 배치 실행은 crawl_batch 모듈에서 담당 (자식 프로세스가 웹 스택을 불러오지 않도록 분리)
+from crawl_batch import do_process_crawl, do_thread_crawl_and_analyze  # noqa: F401
 
+# privateKey.json 설정 (database 모듈에서 한 번만 읽음)
+config = database.get_config()
 
-# 모듈 로드
-spec_review = importlib.util.spec_from_file_location(
-    "naver_review", "naver_review.py")
-naver_review = importlib.util.module_from_spec(spec_review)
-spec_review.loader.exec_module(naver_review)
-
-# privateKey.json 파일에서 데이터베이스 설정 불러오기
-with open('privateKey.json', 'r') as file:
-    config = json.load(file)
-
-# SQLAlchemy 설정
-DATABASE_URL = config['DATABASE_URL']
-Base = declarative_base()
-
-
-class Place(Base):
-    __tablename__ = 'place'
-    place_id = Column(Integer, primary_key=True, index=True)
-    place_num = Column(String)
-
-
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 한 번에 조회할 수 있는 최대 place 수
+FEEDBACK_BATCH_MAX = config.get('FEEDBACK_BATCH_MAX', 500)
 
 # FastAPI 및 스케줄러 설정
 app = FastAPI()
 scheduler = AsyncIOScheduler()
 
 
-def do_thread_crawl_and_analyze(place_pairs: list):
-    thread_list = []
-    with ThreadPoolExecutor(max_workers=8) as executor:
-        for place_id, place_num in place_pairs:
-            thread_list.append(executor.submit(
-                naver_review.run_crawler, place_id, place_num))
-        for execution in concurrent.futures.as_completed(thread_list):
-            execution.result()
-
+def load_places():
+    session = database.Session()
+    try:
+        # Place 모델에서 place_id와 place_num을 함께 가져옵니다.
+        return session.execute(select(Place.place_id, Place.place_num)).all()
+    finally:
+        database.Session.remove()
 
-def do_process_crawl(place_pairs: list):
-    chunk_size = 4
-    chunks = [place_pairs[i:i + chunk_size]
-              for i in range(0, len(place_pairs), chunk_size)]
 
-    process_list = []
-    with ProcessPoolExecutor(max_workers=chunk_size) as executor:
-        for chunk in chunks:
-            process_list.append(executor.submit(
-                do_thread_crawl_and_analyze, chunk))
-        for execution in concurrent.futures.as_completed(process_list):
-            execution.result()
+# 요일 x 시간 슬롯별로 place를 배분하고 주기적으로 목록을 갱신
+# (웹 프로세스는 작업 등록만 하고, 실제 실행은 worker.py가 담당)
+crawl_schedule = crawl_scheduler.CrawlScheduler(
+    scheduler, load_places, job_queue.enqueue,
+    worker_capacity=config.get(
+        'CRAWL_WORKER_CAPACITY', crawl_scheduler.DEFAULT_WORKER_CAPACITY),
+    refresh_minutes=config.get(
+        'CRAWL_REFRESH_MINUTES', crawl_scheduler.DEFAULT_REFRESH_MINUTES))
 
 
 def schedule_tasks():
-    session = SessionLocal()
-    # Place 모델에서 place_id와 place_num을 함께 가져옵니다.
-    places = session.execute(select(Place.place_id, Place.place_num)).all()
-    session.close()
-
-    # 요일별로 회원 ID 그룹핑
-    day_places = {i: [] for i in range(7)}
-    for place_id, place_num in places:
-        day_of_week = place_id % 7
-        day_places[day_of_week].append((place_id, place_num))
-
-    day_map = ['sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat']
-    for day, place_pairs in day_places.items():
-        cron_expr = f"00 03 * * {day_map[day]}"
-        scheduler.add_job(
-            do_process_crawl,
-            CronTrigger.from_crontab(cron_expr),
-            id=f"day_{day}",
-            args=[place_pairs]
-        )
+    crawl_schedule.start()
 
 
 @app.on_event("startup")
 async def startup_event():
+    # 이전 실행에서 남은 프로세스별 측정 파일 정리
+    instrumentation.cleanup_dead()
+    job_queue.init_db()
     schedule_tasks()
     scheduler.start()
 
@@ -112,6 +71,82 @@ async def shutdown_event():
 async def read_root():
     return {"message": "스케줄러가 실행 중입니다"}
 
+
+@app.get("/schedule")
+async def read_schedule():
+    return JSONResponse(content={"code": "SU", "message": "Success",
+                                 "slots": crawl_schedule.projected_load()}, status_code=200)
+
+
+@app.get("/metrics")
+async def read_metrics():
+    # 웹 프로세스와 크롤러/작업자 프로세스의 측정값을 합쳐 Prometheus 형식으로 반환
+    return PlainTextResponse(instrumentation.render_prometheus(),
+                             media_type="text/plain; version=0.0.4")
+
+
+# 수동 수집/분석 요청 (작업 큐에 등록, 같은 place의 요청은 하나의 작업으로 합침)
+@app.post("/places/{place_id}/analyze")
+async def request_analyze(place_id: int, force: bool = False):
+    try:
+        job = await run_in_threadpool(analyze_jobs.submit, place_id, force)
+    except analyze_jobs.PlaceNotFound as e:
+        return JSONResponse(content={"code": "NF", "message": str(e)}, status_code=404)
+
+    if job['status'] == analyze_jobs.FRESH:
+        return JSONResponse(content={"code": "SU", "message": "Success", **job}, status_code=200)
+    return JSONResponse(content={"code": "SU", "message": "Accepted", **job}, status_code=202)
+
+
+@app.get("/analyze/{job_id}")
+async def get_analyze_job(job_id: int):
+    job = await run_in_threadpool(analyze_jobs.get_job, job_id)
+    if job is None:
+        return JSONResponse(content={"code": "NF", "message": "Job not found"}, status_code=404)
+
+    return JSONResponse(content={"code": "SU", "message": "Success", **job}, status_code=200)
+
+
+# 분석 결과 조회 (캐시 사용, updated_at 기반 ETag가 같으면 304)
+def _feedback_response(request: Request, items, content):
+    tag = feedback_cache.etag(items)
+    headers = {'ETag': tag, 'Cache-Control': 'no-cache'}
+    if feedback_cache.etag_matches(request.headers.get('if-none-match'), tag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content={"code": "SU", "message": "Success", **content},
+                        status_code=200, headers=headers)
+
+
+@app.get("/places/{place_id}/feedback")
+async def read_feedback(place_id: int, request: Request):
+    feedback = await run_in_threadpool(feedback_cache.get, place_id)
+    if feedback is None:
+        return JSONResponse(content={"code": "NF", "message": "Feedback not found"}, status_code=404)
+
+    return _feedback_response(request, [(place_id, feedback)],
+                              {"feedback": feedback_cache.serialize(place_id, feedback)})
+
+
+@app.get("/feedback")
+async def read_feedback_batch(place_ids: str, request: Request):
+    # place_ids=1,2,3 형식
+    try:
+        ids = list(dict.fromkeys(int(i) for i in place_ids.split(',') if i.strip()))
+    except ValueError:
+        return JSONResponse(content={"code": "ER", "message": "place_ids는 쉼표로 구분한 숫자여야 합니다."},
+                            status_code=400)
+    if len(ids) > FEEDBACK_BATCH_MAX:
+        return JSONResponse(content={"code": "ER",
+                                     "message": f"place_ids는 {FEEDBACK_BATCH_MAX}개까지 조회할 수 있습니다."},
+                            status_code=400)
+
+    found = await run_in_threadpool(feedback_cache.get_many, ids)
+    return _feedback_response(request, [(place_id, found.get(place_id)) for place_id in ids], {
+        "feedback": [feedback_cache.serialize(place_id, found[place_id])
+                     for place_id in ids if place_id in found],
+        "missing": [place_id for place_id in ids if place_id not in found],
+    })
+
 # place ID 추출
 
 
@@ -123,41 +158,62 @@ async def get_placeNum(request: Request):
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid JSON")
 
-    place_num = getPlaceUrl.getUrl(place_url)
+    place_num = await getPlaceUrl.getUrlAsync(place_url)
 
     return JSONResponse(content={"code": "SU", "message": "Success", "place_num": place_num}, status_code=200)
 
 # 인스타그램 자동 업로더
 
 
+# 업로드 파일을 디스크로 복사할 때 사용하는 버퍼 크기
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def save_upload_file(file: UploadFile):
+    # 업로드 파일 전체를 메모리에 올리지 않고 조각 단위로 임시 파일에 기록
+    with NamedTemporaryFile(delete=False, suffix=".jpg") as temp_file:
+        shutil.copyfileobj(file.file, temp_file, UPLOAD_CHUNK_SIZE)
+        return temp_file.name
+
+
 @app.post("/instagram/upload")
 async def upload_instagram(
     instagramId: str = Form(...),
     instagramPw: str = Form(...),
     content: str = Form(...),
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    background: bool = Form(False)
 ):
     try:
         # Save the uploaded file to a temporary file
-        with NamedTemporaryFile(delete=False, suffix=".jpg") as temp_file:
-            temp_file.write(await file.read())
-            temp_file_path = temp_file.name
+        temp_file_path = await run_in_threadpool(save_upload_file, file)
 
-        # Instagram login
-        cl = Client()
-        cl.login(instagramId, instagramPw)
+        # 백그라운드 모드: 작업 id를 바로 반환하고 업로드는 작업 풀에서 진행
+        if background:
+            job_id = instagram_uploader.submit_upload(
+                instagramId, instagramPw, temp_file_path, content)
+            return JSONResponse(content={"code": "SU", "message": "Accepted", "job_id": job_id},
+                                status_code=202)
 
-        # Upload the photo using the file path
-        cl.photo_upload(temp_file_path, content)
-
-        # Clean up: Delete the temporary file
-        os.remove(temp_file_path)
+        # 로그인 세션을 재사용해서 업로드 (이벤트 루프를 막지 않도록 작업 풀에서 실행)
+        await instagram_uploader.upload_photo_async(
+            instagramId, instagramPw, temp_file_path, content)
 
         return JSONResponse(content={"code": "SU", "message": "Success"}, status_code=200)
 
     except Exception as e:
         return JSONResponse(content={"code": "ER", "message": str(e)}, status_code=400)
 
+
+@app.get("/instagram/upload/{job_id}")
+async def get_instagram_upload(job_id: str):
+    job = instagram_uploader.get_job(job_id)
+    if job is None:
+        return JSONResponse(content={"code": "NF", "message": "Job not found"}, status_code=404)
+
+    return JSONResponse(content={"code": "SU", "message": "Success", "job_id": job_id, **job},
+                        status_code=200)
+
 if __name__ == '__main__':
     import uvicorn
     uvicorn.run(app, host='0.0.0.0', port=8000)
@@ -1,131 +1,387 @@
-from selenium.webdriver.common.by import By
 from urllib3.util.retry import Retry
 from requests.adapters import HTTPAdapter
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.common.exceptions import NoSuchElementException
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.common.keys import Keys
 import os
 import time
-import datetime
+import json
+import threading
 import requests
-import pandas as pd
 import re
 import importlib.util
+import instrumentation
+import review_analyze
+import review_state
+import review_store
 
-spec_analyze = importlib.util.spec_from_file_location(
-    "review_analyze", "review_analyze.py")
-review_analyze = importlib.util.module_from_spec(spec_analyze)
-spec_analyze.loader.exec_module(review_analyze)
+# 크롤링 방식: 'http' (브라우저 없이 요청, 실패 시 selenium으로 대체) 또는 'selenium'
+CRAWL_BACKEND = os.environ.get('CRAWL_BACKEND', 'http')
 
+# 로컬 스텁 서버로 테스트할 수 있도록 호스트를 환경변수로 변경 가능
+NAVER_PLACE_HOST = os.environ.get(
+    'NAVER_PLACE_HOST', 'https://m.place.naver.com')
+NAVER_GRAPHQL_URL = os.environ.get(
+    'NAVER_GRAPHQL_URL', 'https://api.place.naver.com/graphql')
 
-def run_crawler(place_id, place_num):
+# 수집 깊이: 가져올 최대 페이지 수(첫 화면 + 더보기 횟수)와 최대 리뷰 수(0이면 제한 없음)
+MAX_PAGES = int(os.environ.get('CRAWL_MAX_PAGES', 4))
+MAX_REVIEWS = int(os.environ.get('CRAWL_MAX_REVIEWS', 0))
 
-    print(f"place ID: {place_id}에 대한 {place_num}크롤러 실행 중")
+HTTP_MAX_PAGES = MAX_PAGES
+HTTP_PAGE_SIZE = 10
+HTTP_TIMEOUT = (5, 15)
 
-    url = 'https://m.place.naver.com/place/' + \
+# 첫 화면 로딩 / 더보기 후 새 리뷰가 붙을 때까지 기다리는 최대 시간(초)
+PAGE_LOAD_TIMEOUT = 30
+EXPAND_TIMEOUT = 10
+
+REVIEW_ITEM_SELECTOR = 'li.pui__X35jYm.place_apply_pui.EjjAW'
+REVIEW_CONTENT_SELECTOR = 'a.pui__xtsQN-'
+MORE_BUTTON_XPATH = '//a[@class="fvwqf"]/span[text()="더보기"]'
+
+# lxml이 있으면 더 빠른 파서 사용 (설치 여부만 확인하고 불러오지는 않음)
+HTML_PARSER = 'lxml' if importlib.util.find_spec('lxml') else 'html.parser'
+
+COUNT_REVIEWS_SCRIPT = "return document.querySelectorAll(arguments[0]).length;"
+
+# 브라우저 안에서 바로 리뷰 본문만 추출 (page_source 전체를 넘겨받아 파싱하지 않음)
+EXTRACT_REVIEWS_SCRIPT = """
+const items = document.querySelectorAll(arguments[0]);
+const contents = [];
+items.forEach(li => {
+    const content = li.querySelector(arguments[1]);
+    if (content) contents.push(content.textContent);
+});
+return [items.length, contents];
+"""
+
+HTTP_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) "
+                  "AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1",
+    "Accept-Language": "ko-KR,ko;q=0.9",
+}
+
+VISITOR_REVIEWS_QUERY = """query getVisitorReviews($input: VisitorReviewsInput) {
+  visitorReviews(input: $input) {
+    items { id body }
+    total
+  }
+}"""
+
+REVIEW_CLEAN_PATTERN = re.compile(r'[^가-힣0-9\s!?().,]')
+
+APOLLO_STATE_PATTERN = re.compile(
+    r'window\.__APOLLO_STATE__\s*=\s*(\{.*?\});\s*(?:window\.|</script>)', re.S)
+
+_local = threading.local()
+
+
+logger = instrumentation.get_logger('crawler')
+
+
+def review_url(place_num):
+    return NAVER_PLACE_HOST + '/place/' + \
         str(place_num) + '/review/visitor?entry=plt&reviewSort=recent'
 
-    print("*****", url)
 
-    # BS4 setting for secondary access
-    session = requests.Session()
-    headers = {
-        "User-Agent": "user value"}
+def clean_review(content):
+    # 정규식으로 전처리
+    return REVIEW_CLEAN_PATTERN.sub('', content)
 
-    retries = Retry(total=5,
-                    backoff_factor=0.1,
-                    status_forcelist=[500, 502, 503, 504])
 
-    session.mount('http://', HTTPAdapter(max_retries=retries))
+def _caught_up(reviews, watermark):
+    # 지난 실행에서 본 리뷰까지 도달했으면 더 이상 페이지를 넘기지 않음
+    if not watermark:
+        return False
+    cleaned = [c for c in map(clean_review, reviews) if c]
+    return review_state.find_watermark(cleaned, watermark) >= 0
 
-    # New xlsx file
-    now = datetime.datetime.now()
-    list_sheet = []
 
-    # FastAPI 프로젝트 루트 디렉토리의 경로 가져오기
-    base_dir = os.path.dirname(os.path.abspath(__file__))
+def get_http_session():
+    # 스레드마다 하나의 Session을 만들어 keep-alive 연결을 재사용
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        session.headers.update(HTTP_HEADERS)
 
-    # files 폴더 경로 설정
-    files_folder = os.path.join(base_dir, 'files')
+        retries = Retry(total=5,
+                        backoff_factor=0.1,
+                        status_forcelist=[429, 500, 502, 503, 504],
+                        allowed_methods=None)
+        adapter = HTTPAdapter(max_retries=retries,
+                              pool_connections=4, pool_maxsize=4)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
 
-    # files 폴더가 없으면 생성
-    if not os.path.exists(files_folder):
-        os.makedirs(files_folder)
+        _local.session = session
+    return session
 
-    # Start crawling/scraping!
-    try:
-        options = webdriver.ChromeOptions()
-        # options.add_argument('headless')
-        options.add_argument('window-size=1920x1080')
-        options.add_argument("disable-gpu")
-        options.add_argument('--start-fullscreen')
 
-        ChromeDriverManager().install()
+def _reviews_from_apollo_state(html):
+    match = APOLLO_STATE_PATTERN.search(html)
+    if not match:
+        return None
+
+    state = json.loads(match.group(1))
+    reviews = []
+    for key, value in state.items():
+        if isinstance(value, dict) and value.get('__typename') == 'VisitorReview':
+            body = value.get('body')
+            if body:
+                reviews.append(body)
+    return reviews
+
+
+def check_selectors(place_num, item_count, content_count):
+    """선택자가 아무것도 찾지 못하면 페이지 구조 변경 가능성을 알립니다."""
+    if item_count == 0:
+        instrumentation.inc('selector_miss_total', selector='item')
+        logger.warning(f"{place_num} 리뷰 목록 선택자({REVIEW_ITEM_SELECTOR})와 일치하는 항목이 없습니다. "
+                       f"리뷰가 없거나 페이지 구조가 바뀌었을 수 있습니다.", extra={'place_num': place_num})
+        return False
+    if content_count == 0:
+        instrumentation.inc('selector_miss_total', selector='content')
+        logger.warning(f"{place_num} 리뷰 {item_count}건 중 본문 선택자({REVIEW_CONTENT_SELECTOR})와 "
+                       f"일치하는 항목이 없습니다. 페이지 구조가 바뀌었을 수 있습니다.",
+                       extra={'place_num': place_num})
+        return False
+    return True
+
+
+def _reviews_from_html(html, place_num=None):
+    # Apollo 상태가 없는 페이지에서만 사용하므로 필요할 때 불러옴
+    from bs4 import BeautifulSoup
+
+    bs = BeautifulSoup(html, HTML_PARSER)
+    items = bs.select(REVIEW_ITEM_SELECTOR)
+    reviews = []
+    for r in items:
+        content = r.select_one(REVIEW_CONTENT_SELECTOR)
+        if content:
+            reviews.append(content.text)
+    check_selectors(place_num, len(items), len(reviews))
+    return reviews
+
+
+def _limit(reviews):
+    return reviews[:MAX_REVIEWS] if MAX_REVIEWS else reviews
+
+
+def _fetch_review_page(session, place_num, page):
+    payload = [{
+        "operationName": "getVisitorReviews",
+        "variables": {
+            "input": {
+                "businessId": str(place_num),
+                "businessType": "place",
+                "page": page,
+                "size": HTTP_PAGE_SIZE,
+                "sort": "recent",
+                "includeContent": True,
+            }
+        },
+        "query": VISITOR_REVIEWS_QUERY,
+    }]
+    r = session.post(NAVER_GRAPHQL_URL, json=payload, timeout=HTTP_TIMEOUT,
+                     headers={"Referer": review_url(place_num)})
+    r.raise_for_status()
+
+    data = r.json()
+    if isinstance(data, list):
+        data = data[0]
+    items = data['data']['visitorReviews']['items'] or []
+    return [item['body'] for item in items if item.get('body')]
+
+
+def fetch_reviews_http(place_num, watermark=None):
+    """브라우저 없이 방문자 리뷰 원문 목록을 가져옵니다."""
+    session = get_http_session()
+
+    with instrumentation.timer('http_fetch'):
+        r = session.get(review_url(place_num), timeout=HTTP_TIMEOUT)
+        r.raise_for_status()
+
+    # 첫 페이지는 HTML에 포함된 Apollo 상태(없으면 HTML 목록)에서 추출
+    with instrumentation.timer('parse'):
+        reviews = _reviews_from_apollo_state(r.text)
+        if reviews is None:
+            reviews = _reviews_from_html(r.text, place_num)
+    if not reviews or _caught_up(reviews, watermark):
+        return _limit(reviews)
+
+    # 이후 페이지는 JSON으로 요청
+    for page in range(2, HTTP_MAX_PAGES + 1):
+        with instrumentation.timer('http_fetch'):
+            page_reviews = _fetch_review_page(session, place_num, page)
+        if not page_reviews:
+            break
+        reviews.extend(page_reviews)
+        if len(page_reviews) < HTTP_PAGE_SIZE or _caught_up(reviews, watermark) \
+                or (MAX_REVIEWS and len(reviews) >= MAX_REVIEWS):
+            break
+
+    return _limit(reviews)
+
+
+def fetch_reviews_selenium(place_num, watermark=None):
+    """headless Chrome으로 더보기를 눌러가며 리뷰 원문 목록을 가져옵니다."""
+    # selenium은 브라우저 수집이 필요할 때만 불러옴
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.common.action_chains import ActionChains
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.common.keys import Keys
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+    import driver_pool
+
+    # 풀에서 브라우저를 빌려 사용 (반납 시 상태 초기화, 예외 발생 시 재시작)
+    with driver_pool.get_pool().lease() as driver:
+        # 고정된 시간만큼 기다리지 않고 리뷰 목록이 나타나면 바로 진행
+        try:
+            with instrumentation.timer('page_load'):
+                driver.get(review_url(place_num))
+                WebDriverWait(driver, PAGE_LOAD_TIMEOUT).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, REVIEW_ITEM_SELECTOR)))
+        except TimeoutException:
+            check_selectors(place_num, 0, 0)
+            return []
 
-        driver = webdriver.Chrome(options=options)
-        driver.get(url)
-        driver.implicitly_wait(30)
         driver.execute_script(
-            "document.querySelector('div.flicking-camera').style.display='none';")
+            "const camera = document.querySelector('div.flicking-camera'); if (camera) camera.style.display='none';")
 
         # Pagedown
         driver.find_element(By.TAG_NAME, 'body').send_keys(Keys.PAGE_DOWN)
 
-        for i in range(0, 3, 1):
-            try:
-                # 새로운 페이지를 불러오기 위해 스크롤 다운
-                more_button = driver.find_element(
-                    By.XPATH, '//a[@class="fvwqf"]/span[text()="더보기"]')
+        for i in range(1, MAX_PAGES):
+            loaded = driver.execute_script(COUNT_REVIEWS_SCRIPT, REVIEW_ITEM_SELECTOR)
+            if MAX_REVIEWS and loaded >= MAX_REVIEWS:
+                break
 
-                # 스크롤해서 해당 요소가 보이도록 하기
-                actions = ActionChains(driver)
-                actions.move_to_element(more_button).perform()
-                time.sleep(2)
+            if watermark:
+                _, contents = driver.execute_script(
+                    EXTRACT_REVIEWS_SCRIPT, REVIEW_ITEM_SELECTOR, REVIEW_CONTENT_SELECTOR)
+                if _caught_up(contents, watermark):
+                    logger.debug(f"{place_num} 이전에 수집한 리뷰까지 도달")
+                    break
 
-                # 그 후에 클릭 시도
-                more_button.click()
+            more_buttons = driver.find_elements(By.XPATH, MORE_BUTTON_XPATH)
+            if not more_buttons:
+                logger.debug(f"{place_num} 더보기 버튼 모두 클릭 완료")
+                break
 
-            except NoSuchElementException:
-                print('-더보기 버튼 모두 클릭 완료-')
+            # 스크롤해서 해당 요소가 보이도록 한 뒤 클릭
+            ActionChains(driver).move_to_element(more_buttons[0]).perform()
+            more_buttons[0].click()
+
+            # 새 리뷰(li)가 추가될 때까지 대기
+            try:
+                with instrumentation.timer('page_expand'):
+                    WebDriverWait(driver, EXPAND_TIMEOUT).until(
+                        lambda d: d.execute_script(COUNT_REVIEWS_SCRIPT, REVIEW_ITEM_SELECTOR) > loaded)
+            except TimeoutException:
+                logger.debug(f"{place_num} 더 불러올 리뷰가 없습니다")
                 break
 
-        # 새로운 페이지의 리뷰를 가져오기 위해 driver.page_source를 갱신하고 다시 BeautifulSoup으로 파싱
-        html = driver.page_source
-        bs = BeautifulSoup(html, 'html.parser')
-        reviews = bs.select('li.pui__X35jYm.place_apply_pui.EjjAW')
+        with instrumentation.timer('extract'):
+            item_count, contents = driver.execute_script(
+                EXTRACT_REVIEWS_SCRIPT, REVIEW_ITEM_SELECTOR, REVIEW_CONTENT_SELECTOR)
+
+    check_selectors(place_num, item_count, len(contents))
+    return _limit(contents)
+
+
+def fetch_reviews(place_num, backend=None, watermark=None):
+    backend = backend or CRAWL_BACKEND
+
+    if backend == 'http':
+        try:
+            reviews = fetch_reviews_http(place_num, watermark)
+            if reviews:
+                instrumentation.inc('reviews_scraped_total', len(reviews), backend='http')
+                return reviews
+            logger.info(f"{place_num} HTTP 수집 결과 없음, selenium으로 재시도")
+        except Exception as e:
+            logger.warning(f"{place_num} HTTP 수집 실패, selenium으로 재시도: {e}")
+        instrumentation.inc('crawl_fallback_total')
+
+    reviews = fetch_reviews_selenium(place_num, watermark)
+    instrumentation.inc('reviews_scraped_total', len(reviews), backend='selenium')
+    return reviews
 
-        for r in reviews:
-            # 리뷰 가져오는 부분은 그대로 유지
-            content = r.select_one('a.pui__xtsQN-')
 
-            # exception handling
-            if content:
-                content = content.text
+def crawl_place(place_id, place_num, backend=None):
+    """수집 단계만 실행합니다.
 
-                # 정규식으로 전처리
-                content_cleaned = re.sub(r'[^가-힣0-9\s!?().,]', '', content)
-                time.sleep(0.06)
+    분석할 리뷰 목록을 반환하고, 새 리뷰가 없으면 None을 반환합니다. 수집 중 오류는 그대로 올립니다.
+    """
+
+    logger.info(f"place ID: {place_id}에 대한 {place_num}크롤러 실행 중",
+                extra={'place_id': place_id, 'url': review_url(place_num)})
+
+    # 지난 실행의 워터마크 (처음이면 None)
+    with instrumentation.timer('state_io', place_id):
+        state = review_state.load(place_id)
+
+    # Start crawling/scraping!
+    crawled = []
+    try:
+        with instrumentation.timer('crawl', place_id):
+            for content in fetch_reviews(place_num, backend, state and state.watermark):
+                content_cleaned = clean_review(content)
 
                 if content_cleaned:
-                    list_sheet.append([content_cleaned])
-                    time.sleep(0.06)
+                    crawled.append(content_cleaned)
+    except Exception:
+        # 실패하더라도 수집된 리뷰는 이력에 남김
+        review_store.get_store().append(place_id, crawled)
+        raise
+
+    new_count, reviews = review_state.merge(crawled, state)
+    if state and new_count == 0 and state.analyzed:
+        logger.info(f"place_id {place_id} 새 리뷰 없음, 분석 생략", extra={'place_id': place_id})
+        return None
+
+    logger.info(f"place_id {place_id} 새 리뷰 {new_count}건",
+                extra={'place_id': place_id, 'new_reviews': new_count})
+    with instrumentation.timer('state_io', place_id):
+        review_state.save(place_id, reviews)
 
-        # Save the file
-        rating_df = pd.DataFrame(list_sheet, columns=['content'])
-        file_path = os.path.join(
-            files_folder, 'review_' + str(place_id) + '.csv')
-        rating_df.to_csv(file_path, encoding='utf-8-sig', index=False)
+    # 리뷰 이력은 백그라운드에서 저장
+    review_store.get_store().append(place_id, crawled)
+    return reviews
 
-        # 크롤링 완료 후 분석 실행
-        print(f"place_id {place_id} 리뷰 분석 실행")
-        review_analyze.run_analyze(place_id)  # review_analyze.py 실행
+
+def finish_place(place_id, outcome, started_at):
+    """place 하나의 처리 결과와 전체 소요 시간을 기록합니다."""
+    elapsed = time.monotonic() - started_at
+    instrumentation.inc('places_total', outcome=outcome)
+    instrumentation.observe('pipeline_stage_seconds', elapsed, stage='place_total')
+    instrumentation.record_place_stage(place_id, 'place_total', elapsed)
+    logger.info(f"place_id {place_id} 처리 완료 ({outcome}, {elapsed:.2f}초)",
+                extra={'place_id': place_id, 'outcome': outcome, 'seconds': round(elapsed, 3)})
+    # 스케줄러가 부하를 나눌 때 사용할 place별 처리 시간
+    review_state.record_cost(place_id, elapsed)
+
+
+def run_crawler(place_id, place_num, backend=None):
+    """place 하나를 수집/분석합니다. 수집 중 오류가 나면 False를 반환합니다."""
+
+    started_at = time.monotonic()
+    outcome = 'failed'
+    try:
+        reviews = crawl_place(place_id, place_num, backend)
+        if reviews is None:
+            outcome = 'unchanged'
+            return True
+
+        # 크롤링 완료 후 분석 실행 (수집한 리뷰를 그대로 전달)
+        logger.info(f"place_id {place_id} 리뷰 분석 실행", extra={'place_id': place_id})
+        review_analyze.run_analyze(place_id, reviews)
+        outcome = 'analyzed'
+        return True
 
     except Exception as e:
-        print(e)
-        rating_df = pd.DataFrame(list_sheet, columns=['content'])
-        file_path = os.path.join(
-            files_folder, 'review_' + str(place_id) + '.csv')
-        rating_df.to_csv(file_path, encoding='utf-8-sig', index=False)
+        instrumentation.inc('crawl_failures_total')
+        logger.exception(f"place_id {place_id} 처리 실패: {e}", extra={'place_id': place_id})
+        return False
+
+    finally:
+        finish_place(place_id, outcome, started_at)
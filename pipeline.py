@@ -0,0 +1,234 @@
+from concurrent.futures import ThreadPoolExecutor
+import queue
+import threading
+import time
+import database
+import instrumentation
+
+config = database.get_config()
+
+# 단계 사이 큐 크기 (가득 차면 앞 단계가 기다림)
+PIPELINE_QUEUE_SIZE = config.get('PIPELINE_QUEUE_SIZE', 16)
+# 동시에 분석(Clova 응답 대기)할 수 있는 place 수
+PIPELINE_ANALYZE_CONCURRENCY = config.get('PIPELINE_ANALYZE_CONCURRENCY', 32)
+
+ANALYZED = 'analyzed'
+UNCHANGED = 'unchanged'
+FAILED = 'failed'
+# Clova 장애(회로 차단)로 분석하지 못함 - 작업 실패로 세지 않고 나중에 다시 실행
+DEFERRED = 'deferred'
+
+STAGES = ('crawl', 'analyze', 'persist')
+
+logger = instrumentation.get_logger('pipeline')
+
+_STOP = object()
+
+
+class PlacePipeline:
+    """place 처리를 수집(crawl) → 분석(analyze) → 저장(persist) 단계로 나눠 실행합니다.
+
+    수집은 브라우저 수(컨트롤러 상한)만큼의 스레드, 분석은 Clova 클라이언트 이벤트 루프의 코루틴,
+    저장은 배치로 커밋하는 FeedbackWriter가 맡습니다. 단계 사이의 큐는 크기가 정해져 있어
+    뒤 단계가 밀리면 앞 단계가 기다리고, 브라우저는 LLM 응답을 기다리지 않고 다음 place를 수집합니다.
+
+    on_done(token, outcome, error)는 place마다 분석 결과가 커밋되거나, 새 리뷰가 없거나, 실패하면 호출됩니다.
+    Clova 회로가 열려 분석하지 못한 place는 DEFERRED로 알립니다.
+    """
+
+    def __init__(self, controller, on_done=None, backend=None,
+                 analyze_concurrency=None, queue_size=None):
+        self.controller = controller
+        self.on_done = on_done
+        self.backend = backend
+        self.analyze_concurrency = analyze_concurrency or PIPELINE_ANALYZE_CONCURRENCY
+        queue_size = queue_size or PIPELINE_QUEUE_SIZE
+
+        self._crawl_queue = queue.Queue(maxsize=queue_size)
+        self._analyze_queue = queue.Queue(maxsize=queue_size)
+        self._analyze_slots = threading.BoundedSemaphore(self.analyze_concurrency)
+
+        self._counts = dict.fromkeys(STAGES, 0)
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._threads = []
+        self._started_at = None
+        # 분석 완료 처리(DB 기록 등)는 Clova 이벤트 루프가 아닌 별도 스레드에서 실행
+        self._finisher = ThreadPoolExecutor(max_workers=2, thread_name_prefix='pipeline-finish')
+
+    def start(self):
+        self._started_at = time.monotonic()
+        # 수집 스레드는 상한만큼 만들고, 동시에 수집하는 수는 컨트롤러가 정함
+        for i in range(self.controller.aimd.ceiling):
+            self._threads.append(threading.Thread(target=self._crawl_loop,
+                                                  name=f'pipeline-crawl-{i}', daemon=True))
+        self._dispatcher = threading.Thread(target=self._analyze_loop,
+                                            name='pipeline-analyze', daemon=True)
+        for thread in self._threads + [self._dispatcher]:
+            thread.start()
+        return self
+
+    def submit(self, place_id, place_num, token=None):
+        """place를 수집 큐에 넣습니다. 큐가 가득 차면 자리가 날 때까지 기다립니다."""
+        with self._cond:
+            self._pending += 1
+        self._crawl_queue.put((place_id, place_num, token, time.monotonic()))
+        self._report_depth()
+
+    def free_slots(self):
+        return max(0, self._crawl_queue.maxsize - self._crawl_queue.qsize())
+
+    @property
+    def pending(self):
+        with self._cond:
+            return self._pending
+
+    def _report_depth(self):
+        instrumentation.set_gauge('pipeline_queue_depth', self._crawl_queue.qsize(), queue='crawl')
+        instrumentation.set_gauge('pipeline_queue_depth', self._analyze_queue.qsize(),
+                                  queue='analyze')
+
+    def _count(self, stage):
+        with self._cond:
+            self._counts[stage] += 1
+        instrumentation.inc('pipeline_items_total', stage=stage)
+
+    def _finish(self, place_id, token, outcome, started_at, error=None):
+        import naver_review
+
+        try:
+            naver_review.finish_place(place_id, outcome, started_at)
+            if self.on_done:
+                self.on_done(token, outcome, error)
+        except Exception as e:
+            logger.exception(f"place_id {place_id} 완료 처리 실패: {e}",
+                             extra={'place_id': place_id})
+        finally:
+            with self._cond:
+                self._pending -= 1
+                self._cond.notify_all()
+
+    def _crawl_loop(self):
+        # 크롤러 모듈은 실제로 place를 처리하는 프로세스에서만 불러옴
+        import naver_review
+
+        while True:
+            item = self._crawl_queue.get()
+            if item is _STOP:
+                return
+            place_id, place_num, token, started_at = item
+            self._report_depth()
+
+            with self.controller.slot():
+                crawl_started_at = time.monotonic()
+                try:
+                    reviews = naver_review.crawl_place(place_id, place_num, self.backend)
+                except Exception as e:
+                    instrumentation.inc('crawl_failures_total')
+                    logger.exception(f"place_id {place_id} 수집 실패: {e}",
+                                     extra={'place_id': place_id})
+                    self._finish(place_id, token, FAILED, started_at, repr(e))
+                    continue
+                self.controller.record(time.monotonic() - crawl_started_at)
+            self._count('crawl')
+
+            if reviews is None:
+                self._finish(place_id, token, UNCHANGED, started_at)
+                continue
+            # 분석 단계가 밀려 있으면 여기서 기다림 (브라우저는 이미 반납한 상태)
+            self._analyze_queue.put((place_id, token, reviews, started_at))
+            self._report_depth()
+
+    def _analyze_loop(self):
+        while True:
+            item = self._analyze_queue.get()
+            if item is _STOP:
+                return
+            # 분석 모듈(Clova 클라이언트)은 첫 place가 들어올 때 불러옴
+            import review_analyze
+
+            self._report_depth()
+            # Clova 회로가 열려 있으면 기다림 (분석 큐가 차면 수집 단계도 멈춤)
+            client = review_analyze.get_clova_client()
+            wait = client.breaker.retry_after()
+            while wait > 0:
+                logger.warning(f"Clova 호출 차단 중, {wait:.1f}초 후 분석 재개",
+                               extra={'retry_after': wait})
+                time.sleep(wait)
+                wait = client.breaker.retry_after()
+            self._analyze_slots.acquire()
+            place_id, token, reviews, started_at = item
+            logger.info(f"place_id {place_id} 리뷰 분석 실행", extra={'place_id': place_id})
+            # 작업 완료는 결과가 커밋된 뒤에 알림 (커밋 전에 프로세스가 죽으면 작업 임대가 만료되어 다시 실행됨)
+            future = client.submit(review_analyze.analyze_async(
+                place_id, reviews, write_behind=True,
+                on_written=lambda item=item: self._finisher.submit(self._persisted, *item),
+                on_failed=lambda error, item=item: self._finisher.submit(
+                    self._persist_failed, error, *item)))
+            future.add_done_callback(
+                lambda f, item=item: self._finisher.submit(self._analyzed, f, *item))
+
+    def _analyzed(self, future, place_id, token, reviews, started_at):
+        import review_analyze
+
+        self._analyze_slots.release()
+        error = future.exception()
+        if (isinstance(error, review_analyze.AnalysisIncomplete)
+                and review_analyze.get_clova_client().breaker.retry_after() > 0):
+            # 회로 차단으로 요청이 거절됨 - place 자체의 실패가 아니므로 회복 후 다시 실행
+            logger.warning(f"place_id {place_id} Clova 장애로 분석 연기: {error}",
+                           extra={'place_id': place_id})
+            self._finish(place_id, token, DEFERRED, started_at, str(error))
+            return
+        if error is not None:
+            instrumentation.inc('crawl_failures_total')
+            logger.error(f"place_id {place_id} 분석 실패: {error!r}", extra={'place_id': place_id})
+            self._finish(place_id, token, FAILED, started_at, repr(error))
+            return
+        if future.result() is None:
+            # 지난 분석과 리뷰 집합이 같아 저장할 결과가 없음
+            self._finish(place_id, token, UNCHANGED, started_at)
+            return
+        self._count('analyze')
+
+    def _persisted(self, place_id, token, reviews, started_at):
+        self._count('persist')
+        self._finish(place_id, token, ANALYZED, started_at)
+
+    def _persist_failed(self, error, place_id, token, reviews, started_at):
+        logger.error(f"place_id {place_id} 저장 실패: {error!r}", extra={'place_id': place_id})
+        self._finish(place_id, token, FAILED, started_at, repr(error))
+
+    def throughput(self):
+        """단계별 처리량(place/s)을 반환합니다."""
+        elapsed = max(time.monotonic() - self._started_at, 1e-9)
+        with self._cond:
+            return {stage: count / elapsed for stage, count in self._counts.items()}
+
+    def close(self):
+        """넣은 place를 모두 처리하고 저장까지 마친 뒤 단계별 처리량을 기록합니다."""
+        while True:
+            with self._cond:
+                if not self._pending:
+                    break
+                self._cond.wait(timeout=1)
+                analyzed = self._counts['analyze']
+            if analyzed:
+                # 저장을 기다리는 결과가 있으면 주기를 기다리지 않고 바로 저장
+                import review_analyze
+                review_analyze.get_feedback_writer().flush()
+
+        for _ in self._threads:
+            self._crawl_queue.put(_STOP)
+        self._analyze_queue.put(_STOP)
+        for thread in self._threads + [self._dispatcher]:
+            thread.join()
+        self._finisher.shutdown()
+
+        rates = self.throughput()
+        with self._cond:
+            counts = dict(self._counts)
+        logger.info("파이프라인 종료 " + ", ".join(
+            f"{stage} {counts[stage]}건 ({rates[stage]:.2f}/s)" for stage in STAGES),
+            extra={'counts': counts, 'throughput': rates})
+        return rates
@@ -1,230 +1,524 @@
-import pandas as pd
-import requests
+import asyncio
 import json
+import math
+import multiprocessing.util
+import os
+import threading
 
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import create_engine, Column, DateTime, String, Integer, ForeignKey
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import bindparam, select, update
 
 from datetime import datetime
 import pytz
+import database
+import review_state
+import clova_client
+import feedback_cache
+import instrumentation
+from database import Feedback, Session
+
+# privateKey.json 설정 (database 모듈에서 한 번만 읽음)
+config = database.get_config()
+
+logger = instrumentation.get_logger('analyzer')
+
+# 분석 결과를 모아서 한 번에 커밋할지 여부와 배치 크기/최대 대기 시간(초)
+FEEDBACK_WRITE_BEHIND = config.get('FEEDBACK_WRITE_BEHIND', False)
+FEEDBACK_BATCH_SIZE = config.get('FEEDBACK_BATCH_SIZE', 50)
+FEEDBACK_FLUSH_INTERVAL = config.get('FEEDBACK_FLUSH_INTERVAL', 5.0)
+# 배치 저장이 이 횟수만큼 연속으로 실패하면 해당 결과를 버리고 실패로 알림
+FEEDBACK_FLUSH_ATTEMPTS = config.get('FEEDBACK_FLUSH_ATTEMPTS', 3)
+
+feedback_table = Feedback.__table__
+
+# place_id 기준 UPDATE 한 번으로 저장 (조회 후 수정하지 않음)
+UPDATE_FEEDBACK_STMT = (
+    update(feedback_table)
+    .where(feedback_table.c.place_id == bindparam('b_place_id'))
+    .values(p_summary=bindparam('b_p_summary'),
+            n_summary=bindparam('b_n_summary'),
+            keyword=bindparam('b_keyword'),
+            p_body=bindparam('b_p_body'),
+            n_body=bindparam('b_n_body'),
+            updated_at=bindparam('b_updated_at'))
+)
+
+
+# 리뷰 분석 / 피드백 프롬프트
+REVIEW_SYSTEM_PROMPT = "- 주어진 리뷰를 '긍정'과 '부정' 두 가지로 감정 분류하세요. 긍정 리뷰와 부정 리뷰 각각을 3문장으로 요약하세요. 마지막으로 전체 리뷰를 분석하여 키워드 5가지를 추출합니다.\r\n- 감정은 리뷰의 분위기/톤을 분석하여 긍정과 부정을 적절하게 구분하고, 감정을 기준으로 그룹화하세요.\r\n- 그룹화된 리뷰를 각각 3문장으로 요약하세요.\r\n- 전체 리뷰를 분석하여 빈출된 순으로 유의미한 키워드 5가지를 추출합니다. \r\n- 분석 결과는 {'긍정': '긍정 리뷰 3문장 요약', '부정': '부정 리뷰 3문장 요약', '키워드': '키워드 5가지'} 형식으로 제시하세요.\r\n\r\n### \r\n예시:\r\n\r\n미국 가보지는 안았지만 미국버거 맛프랜차이즈와 다르게 맛있어요맛집없는 안양에서 몇 안되는 맛집인듯\r\n\r\n줄서서 먹을정도 까지는 아닌듯\r\n\r\n분위기는 예쁜데 맛은 보통 가격 저렴하지 않음분위기도 중요하지만 일단 식당은 먹으러 가는 곳이니맛도 중요하니까 다시 갈것 같진 않아요\r\n\r\n처음 생겼을때 부터 쭉 이용했는데 이 곳은 정말 지켜주고 싶은 가게에요 성수동에 제가 좋아했던 로컬 식당들 죄다 요상꾸리한거 들어오면서 사라져서 슬펐는데 이 곳은 혼자만 알고 싶은 맛집이었지만 부디 오래오래 이자리에 남아주십사하는 마음에 후기 남겨요 항상 기분 좋게 맞이해주는 사장님 진짜 처음 부터 지금까지 한결 같아요 한번쯤은 지친 모습 보일법도 한데 여길 수차례 왔지만 한번도 못봤어요맛성비 최고인 은준쌀국수 영원하라 포에버\r\n\r\n\r\n{\r\n  \"positive\": \"이 식당은 맛이 좋고, 기분 좋게 맞아주는 사장님이 인상적입니다. 처음부터 지금까지 지속적으로 이용하며, 맛과 가격 모두 만족스럽습니다. 혼자 알고 싶은 맛집으로 오랫동안 기억되기를 바랍니다.\",\r\n  \"negative\": \"미국 버거 프랜차이즈와 비교할 때 맛은 보통이고, 가격이 저렴하지 않습니다. 줄 서서 먹을 정도는 아니며, 다시 갈 것 같지 않습니다. 분위기는 예쁘지만 식당에서 가장 중요한 맛이 부족하다는 느낌입니다.\",\r\n  \"keyword\": [\"맛집\", \"가격\", \"사장님\", \"분위기\", \"맛\"]\r\n}\r"
+
+FEEDBACK_SYSTEM_PROMPT = "- 주어진 데이터를 기반으로 매장에 도움이 될만한 피드백을 제공하세요.\n- positive는 긍정 리뷰이며, negative는 부정 리뷰 요약입니다.\n- 각각의 리뷰에 대해 각각 피드백을 제공합니다.\n- 출력은 꼭 아래의 예시와 같은 형식으로 중괄호 안에 \"positive_feedback\"과 \"negative_feedback\"이 있어야 합니다.\r\n\r\n### \r\n예시:\r\n\r\n\"positive\": \"맛있는 닭한마리 요리를 즐길 수 있으며, 소스와 야채의 조합이 좋다. 맑은 국물과 칼국수, 죽 등의 추가 메뉴도 만족스럽다. 주차장은 복잡하지만 대중교통을 이용하면 편리하다.\",\n\"negative\": \"일부 직원의 불친절한 서비스와 개념 없는 행동, 그리고 음식의 양이나 리필 등에 대한 야박한 인심이 아쉽다. 또한, 주차 문제와 대기 시간이 길다는 점도 불편하다.\"\n\n\n{\"positive_feedback\": \"만족도가 높은 메뉴 조합과 다양한 추가 메뉴를 강조하여 홍보하세요. 특히 소스와 야채 조합의 특성을 살린 특별한 메뉴 소개를 통해 고객의 관심을 끌 수 있습니다. 복잡한 주차 문제를 해결하기 위해, 대중교통을 이용한 방문 방법을 SNS와 매장 내 안내문으로 쉽게 전달하세요. 예를 들어, 가장 가까운 버스나 지하철 역 정보를 제공하면 고객의 방문이 더 수월해질 것입니다.\",\n\"negative_feedback\":\"직원들의 서비스 태도 개선과 일관된 야채 리필 정책을 마련하여 고객의 불편을 최소화하세요. 주차장 관리를 강화하고, 주차 공간 부족 문제를 해결하기 위해 주차 안내판을 설치하거나, 주차 가능 시간을 제한하는 등의 조치를 취할 수 있습니다. 이러한 문제를 해결하면 고객 만족도를 높일 수 있으며, 매장의 이미지 개선에도 도움이 됩니다.\"}"
+
+REDUCE_SYSTEM_PROMPT = "- 주어진 데이터는 한 매장의 리뷰를 여러 묶음으로 나누어 각각 분석한 결과 목록입니다.\r\n- 각 결과의 positive는 긍정 리뷰 요약, negative는 부정 리뷰 요약, keyword는 키워드 목록입니다.\r\n- 모든 결과를 종합하여 긍정 요약과 부정 요약을 각각 3문장으로 다시 작성하세요. 여러 묶음에서 반복되는 내용을 우선으로 반영하세요.\r\n- 전체 결과에서 자주 등장한 순으로 유의미한 키워드 5가지를 추출합니다.\r\n- 출력은 꼭 {\"positive\": \"긍정 리뷰 3문장 요약\", \"negative\": \"부정 리뷰 3문장 요약\", \"keyword\": [\"키워드 5가지\"]} 형식이어야 합니다."
+
+# HCX-003 컨텍스트(8k) 중 시스템 프롬프트와 응답(maxTokens)을 제외하고 리뷰에 쓸 토큰 수
+CHUNK_TOKEN_BUDGET = 3000
+# 한국어 리뷰 기준 토큰당 평균 글자 수 (보수적으로 추정)
+CHARS_PER_TOKEN = 1.5
+
+SAMPLING_PARAMS = {
+    'topP': 0.8,
+    'topK': 0,
+    'maxTokens': 256,
+    'temperature': 0.1,
+    'repeatPenalty': 1.2,
+    'stopBefore': [],
+    'includeAiFilters': True,
+    'seed': 0
+}
+
+
+def get_clova_client():
+    return clova_client.get_client(
+        host=config['CLOVA_HOST'],
+        api_key=config['X_NCP_CLOVASTUDIO_API_KEY'],
+        apigw_key=config['X_NCP_APIGW_API_KEY'],
+        max_concurrency=config.get(
+            'CLOVA_MAX_CONCURRENCY', clova_client.DEFAULT_MAX_CONCURRENCY),
+        rate_per_sec=config.get(
+            'CLOVA_RATE_PER_SEC', clova_client.DEFAULT_RATE_PER_SEC),
+        burst=config.get('CLOVA_BURST', clova_client.DEFAULT_BURST),
+        min_concurrency=config.get(
+            'CLOVA_MIN_CONCURRENCY', clova_client.DEFAULT_MIN_CONCURRENCY),
+        timeout=clova_client.build_timeout(
+            connect=config.get('CLOVA_CONNECT_TIMEOUT', clova_client.DEFAULT_CONNECT_TIMEOUT),
+            read=config.get('CLOVA_READ_TIMEOUT', clova_client.DEFAULT_READ_TIMEOUT)),
+        deadline=config.get('CLOVA_DEADLINE', clova_client.DEFAULT_DEADLINE),
+        max_retries=config.get('CLOVA_MAX_RETRIES', clova_client.DEFAULT_MAX_RETRIES),
+        breaker_threshold=config.get(
+            'CLOVA_BREAKER_THRESHOLD', clova_client.DEFAULT_BREAKER_THRESHOLD),
+        breaker_cooldown=config.get(
+            'CLOVA_BREAKER_COOLDOWN', clova_client.DEFAULT_BREAKER_COOLDOWN))
+
+
+class AnalysisIncomplete(RuntimeError):
+    """분석 단계 중 하나가 실패했습니다. (끝난 단계의 결과는 저장되어 다음 실행에서 이어서 진행)"""
+
+
+def build_review_request(all_reviews):
+    return {
+        'messages': [
+            {"role": "system", "content": REVIEW_SYSTEM_PROMPT},
+            {"role": "user", "content": all_reviews}
+        ],
+        **SAMPLING_PARAMS
+    }
+
+
+def build_feedback_request(analysis_result):
+    return {
+        'messages': [
+            {"role": "system", "content": FEEDBACK_SYSTEM_PROMPT},
+            {"role": "user", "content": f"\"positive\": \"{analysis_result['positive']}\", \"negative\": \"{analysis_result['negative']}\""}
+        ],
+        **SAMPLING_PARAMS
+    }
+
+
+def build_reduce_request(partial_results):
+    return {
+        'messages': [
+            {"role": "system", "content": REDUCE_SYSTEM_PROMPT},
+            {"role": "user", "content": json.dumps(partial_results, ensure_ascii=False)}
+        ],
+        **SAMPLING_PARAMS
+    }
 
-# privateKey.json 파일에서 데이터베이스 설정 불러오기
-with open('privateKey.json', 'r') as file:
-    config = json.load(file)
 
-# SQLAlchemy 설정
-DATABASE_URL = config['DATABASE_URL']
-Base = declarative_base()
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
 
 
-class Feedback(Base):
-    __tablename__ = 'feedback'
+def chunk_by_tokens(items, budget=None, size=estimate_tokens):
+    """순서를 유지하면서 토큰 예산을 넘지 않도록 항목들을 묶습니다."""
+    budget = budget or CHUNK_TOKEN_BUDGET
+    chunks = []
+    current = []
+    used = 0
+    for item in items:
+        tokens = size(item)
+        if current and used + tokens > budget:
+            chunks.append(current)
+            current = []
+            used = 0
+        current.append(item)
+        used += tokens
+    if current:
+        chunks.append(current)
+    return chunks
 
-    feedback_id = Column(Integer, primary_key=True, autoincrement=True)
-    place_id = Column(Integer, ForeignKey('place.place_id'))
-    p_summary = Column(String)
-    p_body = Column(String)
-    n_summary = Column(String)
-    n_body = Column(String)
-    keyword = Column(String)
-    updated_at = Column(DateTime)
 
-# 'places' 테이블을 정의한 예시
+def _truncate(review):
+    # 리뷰 하나가 예산보다 길면 잘라서 사용
+    return review[:int(CHUNK_TOKEN_BUDGET * CHARS_PER_TOKEN)]
 
 
-class Place(Base):
-    __tablename__ = 'place'
+# 응답에 있어야 하는 항목 (없으면 실패로 보고 캐시하지 않음)
+REVIEW_RESULT_KEYS = ('positive', 'negative', 'keyword')
+FEEDBACK_RESULT_KEYS = ('positive_feedback', 'negative_feedback')
 
-    place_id = Column(Integer, primary_key=True, autoincrement=True)
 
+def _has_keys(keys):
+    return lambda result: isinstance(result, dict) and all(key in result for key in keys)
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-session = SessionLocal()
+
+valid_summary = _has_keys(REVIEW_RESULT_KEYS)
+valid_feedback = _has_keys(FEEDBACK_RESULT_KEYS)
 
 
 class CompletionExecutor:
 
-    def review_execute(review_request_data):
-        headers = {
-            'X-NCP-CLOVASTUDIO-API-KEY': config['X_NCP_CLOVASTUDIO_API_KEY'],
-            'X-NCP-APIGW-API-KEY': config['X_NCP_APIGW_API_KEY'],
-            'X-NCP-CLOVASTUDIO-REQUEST-ID': config['X_NCP_CLOVASTUDIO_REQUEST_ID_1'],
-            'Content-Type': 'application/json; charset=utf-8',
-            'Accept': 'text/event-stream'
-        }
-
-        # POST 요청을 보냅니다.
-        with requests.post(config['CLOVA_HOST'] + '/testapp/v1/chat-completions/HCX-003',
-                           headers=headers, json=review_request_data, stream=True) as r:
-
-            flag = True
-            for line in r.iter_lines():
-                if line and flag:
-                    decoded_line = line.decode("utf-8")
-                    if decoded_line.startswith('event:result'):
-                        flag = False
-                        continue
-
-                elif line and not flag:
-                    decoded_line = line.decode("utf-8")
-
-                    if decoded_line.startswith('data:'):
-                        response_text = decoded_line[5:]
-                        print(f"*** review response: {response_text}")
-                        flag = True
-                        break
+    async def review_execute_async(review_request_data):
+        try:
+            return await get_clova_client().complete(
+                review_request_data, config['X_NCP_CLOVASTUDIO_REQUEST_ID_1'], label='review',
+                validate=valid_summary)
+        except clova_client.ClovaError as e:
+            logger.error(f"review 요청 실패: {e}", extra={'call': 'review'})
 
+    async def reduce_execute_async(reduce_request_data):
         try:
-            response_json = json.loads(response_text)
+            return await get_clova_client().complete(
+                reduce_request_data, config['X_NCP_CLOVASTUDIO_REQUEST_ID_1'], label='reduce',
+                validate=valid_summary)
+        except clova_client.ClovaError as e:
+            logger.error(f"reduce 요청 실패: {e}", extra={'call': 'reduce'})
 
-            # 2단계: 내부 content의 문자열을 다시 JSON으로 파싱
-            content_str = response_json['message']['content']
-            # 이스케이프된 문자 처리
-            response = content_str.replace('\\"', '"').replace('\\n', '')
-            content_json = json.loads(response)
+    async def feedback_execute_async(feedback_request_data):
+        try:
+            return await get_clova_client().complete(
+                feedback_request_data, config['X_NCP_CLOVASTUDIO_REQUEST_ID_2'], label='feedback',
+                validate=valid_feedback)
+        except clova_client.ClovaError as e:
+            logger.error(f"feedback 요청 실패: {e}", extra={'call': 'feedback'})
 
-            return content_json
-        except json.JSONDecodeError as e:
-            print(f"JSON 변환 오류: {e}")
+    def review_execute(review_request_data):
+        return get_clova_client().run(
+            CompletionExecutor.review_execute_async(review_request_data))
 
     def feedback_execute(feedback_request_data):
-        headers = {
-            'X-NCP-CLOVASTUDIO-API-KEY': config['X_NCP_CLOVASTUDIO_API_KEY'],
-            'X-NCP-APIGW-API-KEY': config['X_NCP_APIGW_API_KEY'],
-            'X-NCP-CLOVASTUDIO-REQUEST-ID': config['X_NCP_CLOVASTUDIO_REQUEST_ID_2'],
-            'Content-Type': 'application/json; charset=utf-8',
-            'Accept': 'text/event-stream'
-        }
-        print("----feedback start------")
-
-        # POST 요청을 보냅니다.
-        with requests.post(config['CLOVA_HOST'] + '/testapp/v1/chat-completions/HCX-003',
-                           headers=headers, json=feedback_request_data, stream=True) as r:
-
-            flag = True
-            for line in r.iter_lines():
-                if line and flag:
-                    decoded_line = line.decode("utf-8")
-                    if decoded_line.startswith('event:result'):
-                        flag = False
-                        continue
-
-                elif line and not flag:
-                    decoded_line = line.decode("utf-8")
-
-                    if decoded_line.startswith('data:'):
-                        response_text = decoded_line[5:]
-                        print(f"*** feedback response: {response_text}")
-                        flag = True
-                        break
-
+        return get_clova_client().run(
+            CompletionExecutor.feedback_execute_async(feedback_request_data))
+
+
+def _feedback_row(place_id, analysis_result, feedback_result):
+    # 한국 시간으로 updated_at 컬럼 업데이트
+    korea_timezone = pytz.timezone('Asia/Seoul')
+    return {
+        'b_place_id': place_id,
+        'b_p_summary': analysis_result['positive'],
+        'b_n_summary': analysis_result['negative'],
+        'b_keyword': ", ".join(analysis_result['keyword']),
+        'b_p_body': feedback_result['positive_feedback'],
+        'b_n_body': feedback_result['negative_feedback'],
+        'b_updated_at': datetime.now(korea_timezone),
+    }
+
+
+class FeedbackWriter:
+    """분석이 끝난 place의 결과를 모아서 배치로 커밋하는 write-behind 버퍼.
+
+    on_written은 커밋된 뒤에 호출됩니다. 저장에 실패한 배치는 버퍼에 되돌려 다음 주기에 다시 시도하고,
+    max_attempts번 실패하면 on_failed(error)를 호출합니다. 갱신할 feedback 행이 없는 place도 on_failed로 알립니다.
+    """
+
+    def __init__(self, batch_size=FEEDBACK_BATCH_SIZE, flush_interval=FEEDBACK_FLUSH_INTERVAL,
+                 max_attempts=FEEDBACK_FLUSH_ATTEMPTS):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='feedback-writer',
+                                        daemon=True)
+        self._thread.start()
+
+    def add(self, row, on_written=None, on_failed=None):
+        with self._lock:
+            self._buffer.append((row, on_written, on_failed, 0))
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self.flush()
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return
+
+            place_ids = list({row['b_place_id'] for row, *_ in batch})
+            session = Session()
+            try:
+                with instrumentation.timer('db_write'):
+                    # 배치 UPDATE는 행별 rowcount를 알 수 없으므로 같은 트랜잭션에서 갱신될 place를 확인
+                    existing = set(session.execute(
+                        select(feedback_table.c.place_id)
+                        .where(feedback_table.c.place_id.in_(place_ids))).scalars())
+                    session.execute(UPDATE_FEEDBACK_STMT, [row for row, *_ in batch])
+                    session.commit()
+            except Exception as e:
+                session.rollback()
+                self._retry(batch, e)
+                return
+            finally:
+                Session.remove()
+
+            feedback_cache.invalidate(existing)
+
+            logger.info(f"feedback {len(batch)}건 저장 완료 (갱신 {len(existing)}곳)")
+            for row, on_written, on_failed, _ in batch:
+                if row['b_place_id'] in existing:
+                    self._notify(on_written, row)
+                else:
+                    instrumentation.inc('feedback_write_failures_total')
+                    logger.warning(f"place_id {row['b_place_id']}에 해당하는 데이터를 찾을 수 없습니다.",
+                                   extra={'place_id': row['b_place_id']})
+                    self._notify(on_failed, row, _missing_row(row['b_place_id']))
+
+    def _retry(self, batch, error):
+        retry = [(row, on_written, on_failed, attempts + 1)
+                 for row, on_written, on_failed, attempts in batch
+                 if attempts + 1 < self.max_attempts]
+        logger.error(f"feedback 배치 저장 실패 ({len(batch)}건, 다시 시도 {len(retry)}건): {error}")
+        with self._lock:
+            # 다음 주기에 먼저 저장되도록 앞에 넣음
+            self._buffer[:0] = retry
+        for row, _, on_failed, attempts in batch:
+            if attempts + 1 >= self.max_attempts:
+                instrumentation.inc('feedback_write_failures_total')
+                self._notify(on_failed, row, error)
+
+    @staticmethod
+    def _notify(callback, row, *args):
+        if not callback:
+            return
         try:
-            response_json = json.loads(response_text)
+            callback(*args)
+        except Exception as e:
+            logger.exception(f"place_id {row['b_place_id']} 저장 후 처리 실패: {e}",
+                             extra={'place_id': row['b_place_id']})
+
+    def close(self):
+        self._stopped.set()
+        self.flush()
+
+
+def _missing_row(place_id):
+    return LookupError(f"place_id {place_id}의 feedback 행이 없습니다.")
+
 
-            # 2단계: 내부 content의 문자열을 다시 JSON으로 파싱
-            content_str = response_json['message']['content']
-            # 이스케이프된 문자 처리
-            response = content_str.replace('\\"', '"').replace('\\n', '')
-            content_json = json.loads(response)
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
 
-            return content_json
-        except json.JSONDecodeError as e:
-            print(f"JSON 변환 오류: {e}")
+
+def get_feedback_writer():
+    global _writer, _writer_pid
+
+    with _writer_lock:
+        if _writer is None or _writer_pid != os.getpid():
+            _writer = FeedbackWriter()
+            _writer_pid = os.getpid()
+            # 프로세스 종료 시 남은 결과 저장
+            multiprocessing.util.Finalize(None, _writer.close, exitpriority=20)
+        return _writer
 
 
 # place_id로 Feedback 데이터를 업데이트하는 함수
-def update_feedback(place_id, analysis_result, feedback_result):
-    # 1. place_id에 해당하는 기존 데이터 조회
-    feedback = session.query(Feedback).filter_by(place_id=place_id).first()
-
-    if feedback:
-        # 2. positive, negative, keyword 값 추출
-        feedback.p_summary = analysis_result['positive']
-        feedback.n_summary = analysis_result['negative']
-        feedback.keyword = ", ".join(analysis_result['keyword'])
-        feedback.p_body = feedback_result['positive_feedback']
-        feedback.n_body = feedback_result['negative_feedback']
-
-        # 한국 시간으로 updated_at 컬럼 업데이트
-        korea_timezone = pytz.timezone('Asia/Seoul')
-        feedback.updated_at = datetime.now(korea_timezone)
-
-        # 3. 변경 사항 커밋 (데이터베이스에 저장)
-        session.commit()
-        print(f"place_id {place_id}에 해당하는 데이터가 성공적으로 업데이트되었습니다.")
+def update_feedback(place_id, analysis_result, feedback_result, on_written=None,
+                    write_behind=None, on_failed=None):
+    row = _feedback_row(place_id, analysis_result, feedback_result)
+
+    if FEEDBACK_WRITE_BEHIND if write_behind is None else write_behind:
+        # 저장은 나중에 배치로 (저장 실패는 on_failed로 알림)
+        get_feedback_writer().add(row, on_written, on_failed)
+        return
+
+    session = Session()
+    try:
+        with instrumentation.timer('db_write', place_id):
+            result = session.execute(UPDATE_FEEDBACK_STMT, row)
+            session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        Session.remove()
+
+    if result.rowcount:
+        feedback_cache.invalidate([place_id])
+        logger.info(f"place_id {place_id}에 해당하는 데이터가 성공적으로 업데이트되었습니다.")
+        if on_written:
+            on_written()
     else:
-        print(f"place_id {place_id}에 해당하는 데이터를 찾을 수 없습니다.")
+        logger.warning(f"place_id {place_id}에 해당하는 데이터를 찾을 수 없습니다.")
+        if on_failed:
+            on_failed(_missing_row(place_id))
 
 
-def run_analyze(place_id):
-    print(f"place ID: {place_id}에 대한 리뷰 분석 실행중")
+async def _reduce(partial_results):
+    # 부분 결과가 예산을 넘으면 여러 단계로 나누어 합침
+    while len(partial_results) > 1:
+        groups = chunk_by_tokens(
+            partial_results,
+            size=lambda r: estimate_tokens(json.dumps(r, ensure_ascii=False)))
+        if len(groups) == len(partial_results) and len(groups) > 1:
+            # 결과 하나가 예산을 넘는 경우에도 둘씩은 합쳐지도록 보장
+            groups = [partial_results[i:i + 2]
+                      for i in range(0, len(partial_results), 2)]
 
-    # CSV 파일 읽기
-    file_name = f"files/review_{place_id}.csv"
-    try:
-        df = pd.read_csv(file_name)
+        reduced = await asyncio.gather(
+            *[CompletionExecutor.reduce_execute_async(build_reduce_request(group))
+              if len(group) > 1 else _identity(group[0]) for group in groups])
+        partial_results = [r for r in reduced if r]
+        if len(partial_results) < len(groups):
+            return None
 
-        # 모든 리뷰를 한 문자열로 합치기
-        all_reviews = " ".join(df.astype(str).agg(' '.join, axis=1))
+    return partial_results[0] if partial_results else None
 
-        # 프롬프트 텍스트 준비
-        review_preset_text = [
-            {"role": "system",
-                "content": "- 주어진 리뷰를 '긍정'과 '부정' 두 가지로 감정 분류하세요. 긍정 리뷰와 부정 리뷰 각각을 3문장으로 요약하세요. 마지막으로 전체 리뷰를 분석하여 키워드 5가지를 추출합니다.\r\n- 감정은 리뷰의 분위기/톤을 분석하여 긍정과 부정을 적절하게 구분하고, 감정을 기준으로 그룹화하세요.\r\n- 그룹화된 리뷰를 각각 3문장으로 요약하세요.\r\n- 전체 리뷰를 분석하여 빈출된 순으로 유의미한 키워드 5가지를 추출합니다. \r\n- 분석 결과는 {'긍정': '긍정 리뷰 3문장 요약', '부정': '부정 리뷰 3문장 요약', '키워드': '키워드 5가지'} 형식으로 제시하세요.\r\n\r\n### \r\n예시:\r\n\r\n미국 가보지는 안았지만 미국버거 맛프랜차이즈와 다르게 맛있어요맛집없는 안양에서 몇 안되는 맛집인듯\r\n\r\n줄서서 먹을정도 까지는 아닌듯\r\n\r\n분위기는 예쁜데 맛은 보통 가격 저렴하지 않음분위기도 중요하지만 일단 식당은 먹으러 가는 곳이니맛도 중요하니까 다시 갈것 같진 않아요\r\n\r\n처음 생겼을때 부터 쭉 이용했는데 이 곳은 정말 지켜주고 싶은 가게에요 성수동에 제가 좋아했던 로컬 식당들 죄다 요상꾸리한거 들어오면서 사라져서 슬펐는데 이 곳은 혼자만 알고 싶은 맛집이었지만 부디 오래오래 이자리에 남아주십사하는 마음에 후기 남겨요 항상 기분 좋게 맞이해주는 사장님 진짜 처음 부터 지금까지 한결 같아요 한번쯤은 지친 모습 보일법도 한데 여길 수차례 왔지만 한번도 못봤어요맛성비 최고인 은준쌀국수 영원하라 포에버\r\n\r\n\r\n{\r\n  \"positive\": \"이 식당은 맛이 좋고, 기분 좋게 맞아주는 사장님이 인상적입니다. 처음부터 지금까지 지속적으로 이용하며, 맛과 가격 모두 만족스럽습니다. 혼자 알고 싶은 맛집으로 오랫동안 기억되기를 바랍니다.\",\r\n  \"negative\": \"미국 버거 프랜차이즈와 비교할 때 맛은 보통이고, 가격이 저렴하지 않습니다. 줄 서서 먹을 정도는 아니며, 다시 갈 것 같지 않습니다. 분위기는 예쁘지만 식당에서 가장 중요한 맛이 부족하다는 느낌입니다.\",\r\n  \"keyword\": [\"맛집\", \"가격\", \"사장님\", \"분위기\", \"맛\"]\r\n}\r"},
-            {"role": "user", "content": all_reviews}
-        ]
-
-        review_request_data = {
-            'messages': review_preset_text,
-            'topP': 0.8,
-            'topK': 0,
-            'maxTokens': 256,
-            'temperature': 0.1,
-            'repeatPenalty': 1.2,
-            'stopBefore': [],
-            'includeAiFilters': True,
-            'seed': 0
-        }
-
-        # 리뷰 분석 AI 모델에 요청 실행
-        analysis_result = CompletionExecutor.review_execute(
-            review_request_data)
-
-        # 분석 결과 출력
-        if analysis_result:
-            print(f"\n---{place_id} review 분석 결과:")
-            print(json.dumps(analysis_result, indent=4, ensure_ascii=False))
-
-            # 여기에 feedback AI
-            feedback_preset_text = [{"role": "system", "content": "- 주어진 데이터를 기반으로 매장에 도움이 될만한 피드백을 제공하세요.\n- positive는 긍정 리뷰이며, negative는 부정 리뷰 요약입니다.\n- 각각의 리뷰에 대해 각각 피드백을 제공합니다.\n- 출력은 꼭 아래의 예시와 같은 형식으로 중괄호 안에 \"positive_feedback\"과 \"negative_feedback\"이 있어야 합니다.\r\n\r\n### \r\n예시:\r\n\r\n\"positive\": \"맛있는 닭한마리 요리를 즐길 수 있으며, 소스와 야채의 조합이 좋다. 맑은 국물과 칼국수, 죽 등의 추가 메뉴도 만족스럽다. 주차장은 복잡하지만 대중교통을 이용하면 편리하다.\",\n\"negative\": \"일부 직원의 불친절한 서비스와 개념 없는 행동, 그리고 음식의 양이나 리필 등에 대한 야박한 인심이 아쉽다. 또한, 주차 문제와 대기 시간이 길다는 점도 불편하다.\"\n\n\n{\"positive_feedback\": \"만족도가 높은 메뉴 조합과 다양한 추가 메뉴를 강조하여 홍보하세요. 특히 소스와 야채 조합의 특성을 살린 특별한 메뉴 소개를 통해 고객의 관심을 끌 수 있습니다. 복잡한 주차 문제를 해결하기 위해, 대중교통을 이용한 방문 방법을 SNS와 매장 내 안내문으로 쉽게 전달하세요. 예를 들어, 가장 가까운 버스나 지하철 역 정보를 제공하면 고객의 방문이 더 수월해질 것입니다.\",\n\"negative_feedback\":\"직원들의 서비스 태도 개선과 일관된 야채 리필 정책을 마련하여 고객의 불편을 최소화하세요. 주차장 관리를 강화하고, 주차 공간 부족 문제를 해결하기 위해 주차 안내판을 설치하거나, 주차 가능 시간을 제한하는 등의 조치를 취할 수 있습니다. 이러한 문제를 해결하면 고객 만족도를 높일 수 있으며, 매장의 이미지 개선에도 도움이 됩니다.\"}"},
-                                    {"role": "user", "content": f"\"positive\": \"{analysis_result['positive']}\", \"negative\": \"{analysis_result['negative']}\""}]
-
-            feedback_request_data = {
-                'messages': feedback_preset_text,
-                'topP': 0.8,
-                'topK': 0,
-                'maxTokens': 256,
-                'temperature': 0.1,
-                'repeatPenalty': 1.2,
-                'stopBefore': [],
-                'includeAiFilters': True,
-                'seed': 0
-            }
 
-            # 리뷰 분석 AI 모델에 요청 실행
-            feedback_result = CompletionExecutor.feedback_execute(
-                feedback_request_data)
-            print(f"\n---{place_id} feedback 분석 결과:")
-            print(json.dumps(feedback_result, indent=4, ensure_ascii=False))
+async def _identity(result):
+    return result
 
-            if feedback_result:
-                update_feedback(place_id, analysis_result, feedback_result)
 
-        else:
-            print("분석 결과를 받아오지 못했습니다.")
+async def summarize_reviews(reviews, done=None):
+    """리뷰가 한 번에 들어가면 그대로 요청하고, 아니면 묶음별로 요약(map) 후 합칩니다(reduce).
 
-    except FileNotFoundError:
-        print(f"{file_name} 파일을 찾을 수 없습니다.")
+    done에는 묶음 내용의 fingerprint별 요약 결과가 채워지며, 이미 들어 있는 묶음은 다시 요청하지 않습니다.
+    묶음 중 하나라도 실패하면 AnalysisIncomplete를 올립니다.
+    """
+    reviews = [_truncate(review) for review in reviews]
+    chunks = chunk_by_tokens(reviews)
+
+    if len(chunks) <= 1:
+        # 모든 리뷰를 한 문자열로 합치기
+        result = await CompletionExecutor.review_execute_async(
+            build_review_request(" ".join(reviews)))
+        return result if valid_summary(result) else None
+
+    done = {} if done is None else done
+    texts = [" ".join(chunk) for chunk in chunks]
+    keys = [review_state.fingerprint(text) for text in texts]
+    todo = [(key, text) for key, text in zip(keys, texts) if key not in done]
+    logger.info(f"리뷰 {len(reviews)}건을 {len(chunks)}개 묶음으로 나누어 분석 "
+                f"(완료된 묶음 {len(chunks) - len(todo)}개)",
+                extra={'reviews': len(reviews), 'chunks': len(chunks)})
+    results = await asyncio.gather(
+        *[CompletionExecutor.review_execute_async(build_review_request(text)) for _, text in todo])
+
+    failed = 0
+    for (key, _), result in zip(todo, results):
+        if valid_summary(result):
+            done[key] = result
+        else:
+            failed += 1
+    # 일부 묶음만으로 요약하면 결과가 굳어지므로, 성공한 묶음은 남겨 두고 전체를 다시 시도
+    if failed:
+        raise AnalysisIncomplete(f"리뷰 묶음 {len(chunks)}개 중 {failed}개의 요약에 실패했습니다.")
+    return await _reduce([done[key] for key in keys])
+
+
+def _select_reviews(place_id, reviews):
+    # 모듈 로드와 유사도 계산은 CPU를 쓰므로 이벤트 루프가 아닌 스레드에서 실행
+    import review_dedup
+    with instrumentation.timer('dedup', place_id):
+        return review_dedup.select_reviews(
+            reviews, size=lambda review: estimate_tokens(_truncate(review)))
+
+
+async def analyze_async(place_id, reviews=None, write_behind=None, on_written=None,
+                        on_failed=None):
+    logger.info(f"place ID: {place_id}에 대한 리뷰 분석 실행중", extra={'place_id': place_id})
+
+    state = await asyncio.to_thread(review_state.load, place_id)
+    if reviews is None:
+        # 크롤러에서 넘겨받지 않았으면 마지막으로 수집한 리뷰 사용
+        if state is None:
+            logger.warning(f"place_id {place_id}의 수집된 리뷰가 없습니다.", extra={'place_id': place_id})
+            return None
+        reviews = state.reviews
+
+    # 지난 분석과 리뷰 집합이 같으면 LLM 호출 생략
+    review_hash = review_state.review_set_hash(reviews)
+    if state and state.analyzed_hash == review_hash:
+        instrumentation.inc('analyze_skipped_total')
+        logger.info(f"place_id {place_id} 리뷰 변경 없음, 분석 생략", extra={'place_id': place_id})
         return None
+
+    # 지난 실행에서 끝난 단계가 있으면 (리뷰 집합이 같을 때) 그 결과를 이어서 사용
+    partial = await asyncio.to_thread(review_state.load_partial, place_id, review_hash) or {}
+    analysis_result = partial.get('summary')
+    done = partial.get('chunks', {})
+    if partial:
+        instrumentation.inc('analyze_resumed_total')
+        logger.info(f"place_id {place_id} 저장된 중간 결과로 이어서 분석", extra={'place_id': place_id})
+    if not analysis_result:
+        # 중복/짧은 리뷰를 빼고 토큰 예산 안에서 대표 리뷰만 요약에 사용
+        selected = await asyncio.to_thread(_select_reviews, place_id, reviews)
+        if len(selected) < len(reviews):
+            logger.info(f"place_id {place_id} 리뷰 {len(reviews)}건 중 {len(selected)}건으로 요약",
+                        extra={'place_id': place_id, 'reviews': len(reviews), 'selected': len(selected)})
+
+    with instrumentation.timer('analyze', place_id):
+        if not analysis_result:
+            # 리뷰 분석 AI 모델에 요청 실행
+            try:
+                analysis_result = await summarize_reviews(selected, done)
+                if not analysis_result:
+                    raise AnalysisIncomplete(f"place_id {place_id} 분석 결과를 받아오지 못했습니다.")
+            except AnalysisIncomplete:
+                # 성공한 묶음의 요약은 저장해 두고 다음 재시도에서 실패한 묶음만 다시 요청
+                instrumentation.inc('analyze_failures_total', stage='review')
+                if done:
+                    await asyncio.to_thread(
+                        review_state.save_partial, place_id, review_hash, {'chunks': done})
+                raise
+
+            logger.debug(f"{place_id} review 분석 결과",
+                         extra={'place_id': place_id, 'result': analysis_result})
+
+        # 피드백 AI 모델에 요청 실행
+        feedback_result = await CompletionExecutor.feedback_execute_async(
+            build_feedback_request(analysis_result))
+        if not valid_feedback(feedback_result):
+            # 요약 결과는 남겨 두고 다음 재시도에서 피드백만 다시 요청
+            instrumentation.inc('analyze_failures_total', stage='feedback')
+            await asyncio.to_thread(
+                review_state.save_partial, place_id, review_hash, {'summary': analysis_result})
+            raise AnalysisIncomplete(f"place_id {place_id} 피드백 결과를 받아오지 못했습니다.")
+        logger.debug(f"{place_id} feedback 분석 결과",
+                     extra={'place_id': place_id, 'result': feedback_result})
+
+    def written():
+        try:
+            review_state.mark_analyzed(place_id, review_hash)
+        finally:
+            # 결과는 이미 커밋되었으므로 분석 상태 기록에 실패해도 완료로 알림
+            if on_written:
+                on_written()
+
+    await asyncio.to_thread(
+        update_feedback, place_id, analysis_result, feedback_result, written, write_behind,
+        on_failed)
+
+    return analysis_result, feedback_result
+
+
+async def analyze_many(place_ids):
+    """하나의 이벤트 루프에서 여러 place를 동시에 분석합니다."""
+    return await asyncio.gather(
+        *[analyze_async(place_id) for place_id in place_ids], return_exceptions=True)
+
+
+def run_analyze(place_id, reviews=None):
+    return get_clova_client().run(analyze_async(place_id, reviews))
+
+
+def run_analyze_many(place_ids):
+    return get_clova_client().run(analyze_many(place_ids))
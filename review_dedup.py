@@ -0,0 +1,219 @@
+import hashlib
+import re
+import numpy as np
+import database
+import instrumentation
+
+config = database.get_config()
+
+# 공백/문장부호를 뺀 글자 수가 이보다 적은 리뷰는 요약에 사용하지 않음
+MIN_REVIEW_CHARS = config.get('REVIEW_MIN_CHARS', 8)
+# MinHash로 추정한 유사도(Jaccard)가 이 값 이상이면 같은 리뷰로 봄
+NEAR_DUPLICATE_THRESHOLD = config.get('REVIEW_NEAR_DUPLICATE_THRESHOLD', 0.8)
+# 요약에 넘길 리뷰의 최대 토큰 수 (0이면 제한 없음)
+REVIEW_TOKEN_BUDGET = config.get('REVIEW_TOKEN_BUDGET', 6000)
+
+# 글자 3-gram을 64개 해시로 MinHash 서명을 만들고, 4개씩 16개 밴드로 나눠 비교 후보를 찾음
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+BANDS = 16
+# 해시를 한 번에 계산할 개수 (리뷰가 많을 때 메모리 사용량 제한)
+PERM_BLOCK = 16
+
+_PRIME = (1 << 31) - 1
+_BASE = 65537
+# 프로세스마다 같은 서명이 나오도록 고정된 시드 사용
+_rng = np.random.default_rng(20240901)
+_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)
+
+_NON_WORD = re.compile(r'[^가-힣0-9a-z]')
+
+POSITIVE = 1
+NEGATIVE = -1
+NEUTRAL = 0
+
+# 긍정/부정 비율을 유지하기 위한 간단한 단서 단어 (정확한 분류는 LLM이 함)
+POSITIVE_CUES = ('맛있', '친절', '좋아', '좋았', '좋고', '좋네', '최고', '추천', '만족', '깔끔',
+                 '재방문', '또 올', '또 가', '훌륭', '감사', '예쁘', '신선', '푸짐')
+NEGATIVE_CUES = ('별로', '아쉽', '아쉬', '불친절', '최악', '실망', '비싸', '맛없', '불편', '더럽',
+                 '지저분', '비추', '다신', '다시는', '싱거', '불만', '엉망', '비위생', '그닥',
+                 '느려', '오래 기다', '짜요', '짰')
+
+
+def normalize(text):
+    return _NON_WORD.sub('', text.lower())
+
+
+def polarity(text):
+    positive = sum(text.count(cue) for cue in POSITIVE_CUES)
+    negative = sum(text.count(cue) for cue in NEGATIVE_CUES)
+    if negative > positive:
+        return NEGATIVE
+    if positive > negative:
+        return POSITIVE
+    return NEUTRAL
+
+
+def _exact_groups(texts):
+    # 정규화된 내용의 해시가 같은 리뷰는 처음(가장 최신) 리뷰로 묶음
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(t.encode('utf-8'), digest_size=8).digest(), 'little')
+         for t in texts), dtype=np.uint64, count=len(texts))
+    _, first, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+    return first[inverse.reshape(-1)]
+
+
+def signatures(texts):
+    """정규화된 리뷰마다 MinHash 서명(NUM_PERM개)을 계산합니다.
+
+    모든 리뷰를 한 배열로 이어 붙여 shingle 해시와 리뷰별 최솟값을 한 번에 계산합니다.
+    """
+    padded = [t.ljust(SHINGLE_SIZE) for t in texts]
+    lengths = np.fromiter(map(len, padded), dtype=np.int64, count=len(padded))
+    codes = np.frombuffer(''.join(padded).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+
+    # 위치 i에서 시작하는 shingle의 해시
+    count = len(codes) - SHINGLE_SIZE + 1
+    hashes = np.zeros(count, dtype=np.uint64)
+    for t in range(SHINGLE_SIZE):
+        hashes = (hashes * _BASE + codes[t:t + count]) % _PRIME
+
+    # 다음 리뷰에 걸쳐 있는 shingle 제외
+    ends = np.cumsum(lengths)
+    valid = np.ones(count, dtype=bool)
+    for offset in range(1, SHINGLE_SIZE):
+        crossing = ends - offset
+        valid[crossing[crossing < count]] = False
+    hashes = hashes[valid]
+
+    shingle_counts = lengths - SHINGLE_SIZE + 1
+    offsets = np.concatenate(([0], np.cumsum(shingle_counts)[:-1]))
+
+    result = np.empty((len(texts), NUM_PERM), dtype=np.uint64)
+    for i in range(0, NUM_PERM, PERM_BLOCK):
+        permuted = (_A[i:i + PERM_BLOCK, None] * hashes[None, :]
+                    + _B[i:i + PERM_BLOCK, None]) % _PRIME
+        result[:, i:i + PERM_BLOCK] = np.minimum.reduceat(permuted, offsets, axis=1).T
+    return result
+
+
+def near_duplicate_groups(sig, threshold=None):
+    """서명이 비슷한 리뷰끼리 묶고, 리뷰마다 그룹 대표(가장 앞선 리뷰)의 위치를 반환합니다."""
+    threshold = NEAR_DUPLICATE_THRESHOLD if threshold is None else threshold
+    group = np.arange(len(sig))
+    rows = NUM_PERM // BANDS
+
+    for band in range(BANDS):
+        block = sig[:, band * rows:(band + 1) * rows]
+        # 밴드 값이 같은 리뷰만 비교 (각 버킷의 첫 리뷰와 비교)
+        _, first, inverse, counts = np.unique(
+            block, axis=0, return_index=True, return_inverse=True, return_counts=True)
+        inverse = inverse.reshape(-1)
+        members = np.nonzero(counts[inverse] > 1)[0]
+        heads = first[inverse[members]]
+        others = members != heads
+        members, heads = members[others], heads[others]
+        if not len(members):
+            continue
+
+        similarity = (sig[members] == sig[heads]).mean(axis=1)
+        similar = similarity >= threshold
+        np.minimum.at(group, members[similar], group[heads[similar]])
+
+    # 대표를 따라가서 최종 대표로 정리 (대표의 위치는 항상 자기보다 앞)
+    while True:
+        resolved = group[group]
+        if np.array_equal(resolved, group):
+            return group
+        group = resolved
+
+
+def _sample(candidates, weights, labels, tokens, budget):
+    """토큰 예산 안에서 긍정/부정/중립 리뷰 수의 비율대로 리뷰를 고릅니다.
+
+    분류마다 가장 짧은 리뷰 한 건을 먼저 넣고, 남은 예산을 비율대로 나눕니다.
+    같은 분류 안에서는 여러 번 반복된(중복이 많은) 리뷰, 그다음 최신 리뷰를 우선합니다.
+    """
+    order = candidates[np.lexsort((candidates, -weights[candidates]))]
+    chosen = np.zeros(len(tokens), dtype=bool)
+    remaining = budget
+
+    # 분류마다 최소 한 건은 포함 (예산이 허락하는 만큼)
+    groups = [(label, order[labels[order] == label]) for label in (NEGATIVE, POSITIVE, NEUTRAL)]
+    groups = [(label, members) for label, members in groups if len(members)]
+    for _, members in groups:
+        shortest = members[np.argmin(tokens[members])]
+        if tokens[shortest] <= remaining:
+            chosen[shortest] = True
+            remaining -= tokens[shortest]
+
+    # 남은 예산은 분류별 리뷰 수 비율대로 나눔
+    rest = remaining
+    for _, members in groups:
+        quota = rest * len(members) / len(candidates)
+        pending = members[~chosen[members]]
+        taken = pending[np.cumsum(tokens[pending]) <= min(quota, remaining)]
+        chosen[taken] = True
+        remaining -= tokens[taken].sum()
+
+    # 남은 예산은 우선순위대로 아직 고르지 않은 리뷰로 채움
+    for i in order[~chosen[order]]:
+        if tokens[i] <= remaining:
+            chosen[i] = True
+            remaining -= tokens[i]
+    return np.nonzero(chosen)[0]
+
+
+def select_reviews(reviews, size, budget=None):
+    """요약에 넘길 리뷰를 골라서 원래 순서대로 반환합니다.
+
+    1. 너무 짧은 리뷰 제외 (모두 짧으면 그대로 사용)
+    2. 공백/문장부호를 뺀 내용이 같은 리뷰는 하나만 남김
+    3. MinHash 유사도가 높은 리뷰는 가장 최신 리뷰만 남김
+    4. 예산(size로 계산한 토큰 수)을 넘으면 긍정/부정 비율을 유지하며 대표 리뷰를 고름
+    """
+    budget = REVIEW_TOKEN_BUDGET if budget is None else budget
+    if not reviews:
+        return []
+
+    texts = [normalize(review) for review in reviews]
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    candidates = np.nonzero(lengths >= MIN_REVIEW_CHARS)[0]
+    if not len(candidates):
+        candidates = np.nonzero(lengths > 0)[0]
+        if not len(candidates):
+            return list(reviews)
+    short = len(reviews) - len(candidates)
+
+    # 중복 리뷰 수는 대표 리뷰의 가중치가 됨
+    weights = np.zeros(len(reviews), dtype=np.int64)
+    exact = candidates[_exact_groups([texts[i] for i in candidates])]
+    np.add.at(weights, exact, 1)
+    unique = np.nonzero(weights)[0]
+    duplicates = len(candidates) - len(unique)
+
+    near = unique[near_duplicate_groups(signatures([texts[i] for i in unique]))]
+    merged = np.zeros(len(reviews), dtype=np.int64)
+    np.add.at(merged, near, weights[unique])
+    weights = merged
+    representatives = np.nonzero(weights)[0]
+    near_duplicates = len(unique) - len(representatives)
+
+    tokens = np.zeros(len(reviews), dtype=np.int64)
+    tokens[representatives] = [size(reviews[i]) for i in representatives]
+    selected = representatives
+    if budget and tokens.sum() > budget:
+        labels = np.zeros(len(reviews), dtype=np.int8)
+        labels[representatives] = [polarity(reviews[i]) for i in representatives]
+        selected = _sample(representatives, weights, labels, tokens, budget)
+        if not len(selected):
+            # 리뷰 하나가 예산보다 길면 가장 앞선 리뷰만 (잘라서) 사용
+            selected = representatives[:1]
+    over_budget = len(representatives) - len(selected)
+
+    for reason, dropped in (('short', short), ('duplicate', duplicates),
+                            ('near_duplicate', near_duplicates), ('budget', over_budget)):
+        if dropped:
+            instrumentation.inc('reviews_dropped_total', dropped, reason=reason)
+    return [reviews[i] for i in selected]
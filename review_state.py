@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+# 워터마크로 사용할 최신 리뷰 개수 (짧은 중복 리뷰로 인한 오탐을 줄이기 위해 여러 개를 연속으로 비교)
+WATERMARK_SIZE = 3
+# place별 처리 시간 이동 평균의 가중치
+COST_ALPHA = 0.3
+
+STATE_DB_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'files', 'review_state.db')
+
+
+def fingerprint(content):
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]
+
+
+def review_set_hash(reviews):
+    # 리뷰 내용과 순서를 모두 반영한 해시
+    h = hashlib.sha1()
+    for position, content in enumerate(reviews):
+        h.update(f"{position}:{fingerprint(content)}\n".encode('utf-8'))
+    return h.hexdigest()
+
+
+def find_watermark(reviews, watermark):
+    """최신순 리뷰 목록에서 지난 실행의 워터마크가 시작되는 위치를 찾습니다. (없으면 -1)"""
+    if not watermark:
+        return -1
+
+    # 워터마크 전체가 연속으로 일치해야 함 (목록 끝에서 일부만 일치하는 것은 인정하지 않음.
+    # 저장된 워터마크가 짧으면 그 길이만큼만 비교)
+    fps = [fingerprint(content) for content in reviews]
+    for i in range(len(fps) - len(watermark) + 1):
+        if fps[i:i + len(watermark)] == watermark:
+            return i
+    return -1
+
+
+class PlaceState:
+
+    def __init__(self, place_id, reviews, watermark, review_hash, analyzed_hash):
+        self.place_id = place_id
+        self.reviews = reviews
+        self.watermark = watermark
+        self.review_hash = review_hash
+        self.analyzed_hash = analyzed_hash
+
+    @property
+    def analyzed(self):
+        return self.analyzed_hash is not None and self.analyzed_hash == self.review_hash
+
+
+def _connect():
+    os.makedirs(os.path.dirname(STATE_DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(STATE_DB_PATH, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS place_state (
+            place_id INTEGER PRIMARY KEY,
+            reviews TEXT NOT NULL,
+            watermark TEXT NOT NULL,
+            review_hash TEXT NOT NULL,
+            analyzed_hash TEXT,
+            updated_at TEXT NOT NULL
+        )""")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS place_partial (
+            place_id INTEGER PRIMARY KEY,
+            review_hash TEXT NOT NULL,
+            result TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )""")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS place_slot (
+            place_id INTEGER PRIMARY KEY,
+            day INTEGER NOT NULL,
+            hour INTEGER NOT NULL
+        )""")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS place_cost (
+            place_id INTEGER PRIMARY KEY,
+            seconds REAL NOT NULL,
+            samples INTEGER NOT NULL
+        )""")
+    return conn
+
+
+def load(place_id):
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT reviews, watermark, review_hash, analyzed_hash FROM place_state WHERE place_id = ?",
+            (place_id,)).fetchone()
+    finally:
+        conn.close()
+
+    if row is None:
+        return None
+    return PlaceState(place_id, json.loads(row[0]), json.loads(row[1]), row[2], row[3])
+
+
+def save(place_id, reviews):
+    """이번 실행에서 확정된 리뷰 목록과 워터마크를 저장하고 리뷰 집합 해시를 반환합니다."""
+    review_hash = review_set_hash(reviews)
+    watermark = [fingerprint(content) for content in reviews[:WATERMARK_SIZE]]
+
+    conn = _connect()
+    try:
+        with conn:
+            conn.execute("""
+                INSERT INTO place_state (place_id, reviews, watermark, review_hash, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(place_id) DO UPDATE SET
+                    reviews = excluded.reviews,
+                    watermark = excluded.watermark,
+                    review_hash = excluded.review_hash,
+                    updated_at = excluded.updated_at""",
+                         (place_id, json.dumps(reviews, ensure_ascii=False), json.dumps(watermark),
+                          review_hash, datetime.now().isoformat()))
+    finally:
+        conn.close()
+    return review_hash
+
+
+def mark_analyzed(place_id, review_hash):
+    conn = _connect()
+    try:
+        with conn:
+            conn.execute("UPDATE place_state SET analyzed_hash = ? WHERE place_id = ?",
+                         (review_hash, place_id))
+            conn.execute("DELETE FROM place_partial WHERE place_id = ?", (place_id,))
+    finally:
+        conn.close()
+
+
+def save_partial(place_id, review_hash, result):
+    """분석 도중 실패했을 때 끝난 단계의 결과(리뷰 요약)를 저장합니다."""
+    conn = _connect()
+    try:
+        with conn:
+            conn.execute("""
+                INSERT INTO place_partial (place_id, review_hash, result, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(place_id) DO UPDATE SET
+                    review_hash = excluded.review_hash,
+                    result = excluded.result,
+                    updated_at = excluded.updated_at""",
+                         (place_id, review_hash, json.dumps(result, ensure_ascii=False),
+                          datetime.now().isoformat()))
+    finally:
+        conn.close()
+
+
+def load_partial(place_id, review_hash):
+    """같은 리뷰 집합으로 저장된 중간 결과가 있으면 반환합니다."""
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT result FROM place_partial WHERE place_id = ? AND review_hash = ?",
+            (place_id, review_hash)).fetchone()
+    finally:
+        conn.close()
+    return json.loads(row[0]) if row else None
+
+
+def merge(crawled, state):
+    """새로 수집한 리뷰와 지난 실행의 리뷰를 합쳐 (새 리뷰 수, 최종 리뷰 목록)을 반환합니다."""
+    if state is None:
+        return len(crawled), crawled
+
+    index = find_watermark(crawled, state.watermark)
+    if index < 0:
+        # 워터마크를 찾지 못하면 (리뷰 삭제 등) 이번에 수집한 목록을 그대로 사용
+        return len(crawled), crawled
+
+    new_reviews = crawled[:index]
+    window = max(len(state.reviews), len(crawled))
+    return len(new_reviews), (new_reviews + state.reviews)[:window]
+
+
+def record_cost(place_id, seconds):
+    """place 하나를 처리하는 데 걸린 시간을 이동 평균으로 기록합니다."""
+    conn = _connect()
+    try:
+        with conn:
+            conn.execute("""
+                INSERT INTO place_cost (place_id, seconds, samples) VALUES (?, ?, 1)
+                ON CONFLICT(place_id) DO UPDATE SET
+                    seconds = seconds * (1 - ?) + excluded.seconds * ?,
+                    samples = samples + 1""",
+                         (place_id, seconds, COST_ALPHA, COST_ALPHA))
+    finally:
+        conn.close()
+
+
+def load_costs():
+    conn = _connect()
+    try:
+        rows = conn.execute("SELECT place_id, seconds FROM place_cost").fetchall()
+    finally:
+        conn.close()
+    return dict(rows)
+
+
+def load_slots():
+    """스케줄러가 배정한 place별 (요일, 시) 슬롯을 반환합니다."""
+    conn = _connect()
+    try:
+        rows = conn.execute("SELECT place_id, day, hour FROM place_slot").fetchall()
+    finally:
+        conn.close()
+    return {place_id: (day, hour) for place_id, day, hour in rows}
+
+
+def save_slots(assignment):
+    """place별 슬롯 배정을 통째로 저장합니다. (목록에 없는 place는 삭제)"""
+    conn = _connect()
+    try:
+        with conn:
+            conn.execute("DELETE FROM place_slot")
+            conn.executemany("INSERT INTO place_slot (place_id, day, hour) VALUES (?, ?, ?)",
+                             [(place_id, day, hour)
+                              for place_id, (day, hour) in assignment.items()])
+    finally:
+        conn.close()
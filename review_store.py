@@ -0,0 +1,129 @@
+import multiprocessing.util
+import os
+import queue
+import sqlite3
+import threading
+from datetime import datetime
+import instrumentation
+import review_state
+
+logger = instrumentation.get_logger('review_store')
+
+STORE_DB_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'files', 'review_store.db')
+
+# 한 번에 커밋할 최대 place 수
+WRITE_BATCH_SIZE = 64
+
+
+def _connect():
+    os.makedirs(os.path.dirname(STORE_DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(STORE_DB_PATH, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS review (
+            place_id INTEGER NOT NULL,
+            fingerprint TEXT NOT NULL,
+            content TEXT NOT NULL,
+            crawled_at TEXT NOT NULL,
+            PRIMARY KEY (place_id, fingerprint)
+        ) WITHOUT ROWID""")
+    return conn
+
+
+class ReviewStore:
+    """수집한 리뷰를 place별로 누적 저장하는 append-only 저장소.
+
+    append()는 큐에 넣고 바로 반환하며, 별도 스레드가 모아서 기록합니다.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='review-store',
+                                        daemon=True)
+        self._thread.start()
+
+    def append(self, place_id, reviews):
+        if reviews:
+            self._queue.put((place_id, list(reviews), datetime.now().isoformat()))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            while len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in batch
+            self._write([item for item in batch if item is not None])
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _write(self, batch):
+        if not batch:
+            return
+
+        rows = []
+        for place_id, reviews, crawled_at in batch:
+            for content in reviews:
+                rows.append((place_id, review_state.fingerprint(content),
+                             content, crawled_at))
+        try:
+            conn = _connect()
+            try:
+                with conn, instrumentation.timer('review_store_write'):
+                    # 이미 저장된 리뷰는 무시 (최초 수집 시각 유지)
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO review (place_id, fingerprint, content, crawled_at) VALUES (?, ?, ?, ?)",
+                        rows)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            instrumentation.inc('review_store_failures_total')
+            logger.error(f"리뷰 저장 실패 ({len(rows)}건): {e}")
+
+    def flush(self):
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=30)
+
+
+def load_history(place_id, since=None):
+    """저장된 리뷰를 수집 시각 순으로 반환합니다."""
+    conn = _connect()
+    try:
+        if since:
+            rows = conn.execute(
+                "SELECT content FROM review WHERE place_id = ? AND crawled_at >= ? ORDER BY crawled_at",
+                (place_id, since)).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT content FROM review WHERE place_id = ? ORDER BY crawled_at",
+                (place_id,)).fetchall()
+    finally:
+        conn.close()
+    return [row[0] for row in rows]
+
+
+_store = None
+_store_pid = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store, _store_pid
+
+    with _store_lock:
+        if _store is None or _store_pid != os.getpid():
+            _store = ReviewStore()
+            _store_pid = os.getpid()
+            # 프로세스 종료 전 남은 리뷰 기록
+            multiprocessing.util.Finalize(None, _store.close, exitpriority=20)
+        return _store
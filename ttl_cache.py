@@ -0,0 +1,55 @@
+from collections import OrderedDict
+import threading
+import time
+
+
+class TTLCache:
+    """크기 제한(LRU)과 만료 시간(TTL)이 있는 스레드 안전 메모리 캐시."""
+
+    _MISSING = object()
+
+    def __init__(self, maxsize=1024, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, self._MISSING)
+            if item is self._MISSING:
+                return default
+
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, self._MISSING)
+        if item is self._MISSING:
+            return default
+        return item[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return self.get(key, self._MISSING) is not self._MISSING
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
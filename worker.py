@@ -0,0 +1,183 @@
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import uuid
+import concurrency
+import database
+import instrumentation
+import job_queue
+
+# 작업자 한 프로세스에서 동시에 처리할 place 수의 상한/하한 (실제 값은 자원 상태에 따라 조정)
+DEFAULT_THREADS = 8
+DEFAULT_MIN_THREADS = 1
+# 대기 중인 작업이 없을 때 다시 확인하는 간격(초)
+DEFAULT_POLL_SECONDS = 5
+
+logger = instrumentation.get_logger('worker')
+
+
+class Worker:
+    """작업 큐에서 place 작업을 임대해 크롤링/분석을 실행하는 작업자.
+
+    실행 중인 작업은 주기적으로 임대를 연장하며, 프로세스가 죽으면 임대가 만료되어
+    다른 작업자가 다시 가져갑니다.
+    """
+
+    def __init__(self, threads=DEFAULT_THREADS, lease_seconds=job_queue.DEFAULT_LEASE_SECONDS,
+                 poll_seconds=DEFAULT_POLL_SECONDS, drain=False, min_threads=DEFAULT_MIN_THREADS):
+        self.threads = threads
+        self.min_threads = min(min_threads, threads)
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.drain = drain
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        # job_id -> place_id
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        # 임대 연장은 종료 요청 후에도 남은 작업을 마무리할 때까지 계속함
+        self._closed = threading.Event()
+
+        config = database.get_config()
+        self.controller = concurrency.ConcurrencyController(
+            'worker', self.min_threads, self.threads,
+            initial=max(self.min_threads, self.threads // 2),
+            min_free_memory_mb=config.get('MIN_FREE_MEMORY_MB', concurrency.MIN_FREE_MEMORY_MB),
+            max_cpu_load=config.get('MAX_CPU_LOAD', concurrency.MAX_CPU_LOAD))
+
+    def stop(self, *args):
+        logger.info("종료 요청, 실행 중인 작업을 마무리합니다.", extra={'owner': self.owner})
+        self._stop.set()
+
+    def _heartbeat_loop(self):
+        while not self._closed.wait(self.lease_seconds / 3):
+            with self._lock:
+                job_ids = list(self._inflight)
+            try:
+                job_queue.heartbeat(self.owner, job_ids, self.lease_seconds)
+            except Exception as e:
+                logger.warning(f"임대 연장 실패: {e}", extra={'owner': self.owner})
+
+    def _job_done(self, job_id, outcome, error):
+        import pipeline
+
+        with self._lock:
+            place_id = self._inflight.get(job_id)
+        # 상태 조회 API에서 보여줄 단계별 소요 시간을 작업 행에 함께 기록
+        stages = instrumentation.place_stages(place_id) if place_id is not None else None
+        try:
+            if outcome == pipeline.FAILED:
+                job_queue.fail(job_id, self.owner, error or 'crawl failed', stages)
+                instrumentation.inc('jobs_finished_total', outcome='failed')
+            elif outcome == pipeline.DEFERRED:
+                # Clova 회로가 다시 열릴 때까지 미룸 (장애 동안 재시도 횟수를 쓰지 않음)
+                import review_analyze
+                retry_after = review_analyze.get_clova_client().breaker.retry_after()
+                job_queue.defer(job_id, self.owner, retry_after, error or 'clova unavailable')
+                instrumentation.inc('jobs_finished_total', outcome='deferred')
+            else:
+                job_queue.complete(job_id, self.owner, stages)
+                instrumentation.inc('jobs_finished_total', outcome='done')
+        finally:
+            with self._lock:
+                self._inflight.pop(job_id, None)
+
+    def run(self):
+        # 무거운 크롤러 모듈은 작업자 프로세스에서만 불러옴
+        import driver_pool
+        import pipeline
+
+        job_queue.init_db()
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name='job-heartbeat',
+                                     daemon=True)
+        heartbeat.start()
+        logger.info(f"작업자 시작 (동시 수집 {self.min_threads}~{self.threads})",
+                    extra={'owner': self.owner})
+
+        # 동시 수집 수(상한)만큼 브라우저를 재사용
+        driver_pool.get_pool(max_size=self.threads)
+        # 수집 → 분석 → 저장 단계로 나눠 실행 (임대는 분석이 끝날 때까지 연장됨)
+        place_pipeline = pipeline.PlacePipeline(self.controller, on_done=self._job_done)
+        self.controller.start()
+        place_pipeline.start()
+
+        while not self._stop.is_set():
+            # 수집 큐에 남은 자리만큼만 임대 (분석이 밀리면 수집 큐가 비지 않아 임대도 줄어듦)
+            free = place_pipeline.free_slots()
+
+            try:
+                jobs = job_queue.claim(self.owner, free, self.lease_seconds) if free else []
+            except Exception as e:
+                logger.warning(f"작업 임대 실패: {e}", extra={'owner': self.owner})
+                jobs = []
+            for job in jobs:
+                with self._lock:
+                    self._inflight[job.job_id] = job.place_id
+                instrumentation.reset_place_stages(job.place_id)
+                place_pipeline.submit(job.place_id, job.place_num, job.job_id)
+
+            if not jobs:
+                with self._lock:
+                    idle = not self._inflight
+                if self.drain and idle:
+                    pending = job_queue.counts()
+                    if not pending[job_queue.QUEUED] and not pending[job_queue.RUNNING]:
+                        break
+                self._stop.wait(self.poll_seconds if free else 1)
+
+        # 임대한 작업은 모두 마무리하고 종료
+        place_pipeline.close()
+        self._stop.set()
+        self._closed.set()
+        self.controller.stop()
+        logger.info("작업자 종료", extra={'owner': self.owner})
+
+
+def run_worker(threads, lease_seconds, poll_seconds, drain, min_threads=DEFAULT_MIN_THREADS):
+    worker = Worker(threads, lease_seconds, poll_seconds, drain, min_threads)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='크롤링 작업 큐 작업자')
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS,
+                        help='프로세스당 동시 처리 place 수 상한')
+    parser.add_argument('--min-threads', type=int, default=DEFAULT_MIN_THREADS,
+                        help='프로세스당 동시 처리 place 수 하한')
+    parser.add_argument('--lease', type=int, default=job_queue.DEFAULT_LEASE_SECONDS)
+    parser.add_argument('--poll', type=float, default=DEFAULT_POLL_SECONDS)
+    parser.add_argument('--drain', action='store_true',
+                        help='대기 중인 작업을 모두 처리하면 종료')
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        run_worker(args.threads, args.lease, args.poll, args.drain, args.min_threads)
+        return
+
+    processes = [multiprocessing.Process(target=run_worker,
+                                         args=(args.threads, args.lease, args.poll, args.drain,
+                                               args.min_threads))
+                 for _ in range(args.processes)]
+    for p in processes:
+        p.start()
+
+    def forward(signum, frame):
+        for p in processes:
+            if p.pid:
+                os.kill(p.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for p in processes:
+        p.join()
+
+
+if __name__ == '__main__':
+    main()